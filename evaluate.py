@@ -0,0 +1,328 @@
+"""Labeled-trace evaluation of the gesture detectors.
+
+Replays a corpus of hand landmark traces with labeled shoot, reload and
+point gestures through MediapipeManager across a process pool and prints
+precision, recall and detection latency per gesture for every
+configuration of a parameter grid, e.g.
+
+    python evaluate.py --traces 2000 \\
+        --param ShootDetector.MARK_DETECTION_ACCURACY=0.03,0.05 \\
+        --param PointDetector.DETECTION_TIME=0.8,1
+    python evaluate.py --traces 500 --write-corpus corpus.jsonl
+    python evaluate.py --corpus corpus.jsonl --param MediapipeManager.SHOOT_MODE=legacy,velocity
+
+Without --corpus the traces are generated by synthetic_hand from random
+scripts, one seed per trace, so every worker can rebuild them locally.
+A corpus file holds one JSON trace per line: hand count, stream config,
+labels and the (arrival, results) frames; files ending in .gz are gzipped.
+"""
+
+import argparse
+from dataclasses import asdict, dataclass, field
+import gzip
+import json
+import math
+from multiprocessing import Pool
+import os
+import random
+import statistics
+import sys
+from typing import Any
+
+import main
+from simulator import apply_params, parse_grid
+from synthetic_hand import (
+    Label,
+    Segment,
+    StreamConfig,
+    SyntheticHandStream,
+    aim,
+    detect_events,
+    dropout,
+    flick,
+    jitter,
+    match_events,
+    move,
+    point_dwell,
+    reload,
+)
+
+GESTURES = ('shoot', 'reload', 'point')
+SLACK = 0.3
+TRACE_DURATION = 20
+# screen units per second of unlabeled moves, fast upward moves after a hold are flicks
+REPOSITION_SPEED = 0.6
+# decimals kept for landmark coordinates in a corpus, well below the landmark noise
+CORPUS_PRECISION = 5
+
+
+@dataclass
+class Trace:
+    config: StreamConfig
+    hand_num: int
+    labels: list[Label]
+    frames: Any
+
+    def to_json(self) -> str:
+        return json.dumps(
+            {
+                'config': asdict(self.config),
+                'hands': self.hand_num,
+                'labels': [asdict(label) for label in self.labels],
+                'frames': [
+                    (round(arrival, CORPUS_PRECISION), self.round_results(results))
+                    for arrival, results in self.frames
+                ],
+            }
+        )
+
+    @staticmethod
+    def round_results(results: dict[str, Any]) -> dict[str, Any]:
+        landmarks = [
+            [
+                {axis: round(value, CORPUS_PRECISION) for axis, value in landmark.items()}
+                for landmark in hand
+            ]
+            for hand in results['landmarks']
+        ]
+        return {**results, 'landmarks': landmarks}
+
+    @classmethod
+    def from_json(cls, line: str) -> 'Trace':
+        data = json.loads(line)
+        return cls(
+            StreamConfig(**data['config']),
+            data['hands'],
+            [Label(**label) for label in data['labels']],
+            [tuple(frame) for frame in data['frames']],
+        )
+
+
+@dataclass
+class GestureStats:
+    labels: int = 0
+    false_positives: int = 0
+    delays: list[float] = field(default_factory=list)
+
+    @property
+    def hits(self) -> int:
+        return len(self.delays)
+
+    @property
+    def precision(self) -> float:
+        detections = self.hits + self.false_positives
+        return self.hits / detections if detections else 1
+
+    @property
+    def recall(self) -> float:
+        return self.hits / self.labels if self.labels else 1
+
+    @property
+    def f1(self) -> float:
+        total = self.precision + self.recall
+        return 2 * self.precision * self.recall / total if total else 0
+
+    def latency(self, quantile: float) -> float:
+        if len(self.delays) < 2:
+            return self.delays[0] if self.delays else 0
+        return statistics.quantiles(self.delays, n=100, method='inclusive')[
+            int(quantile * 100) - 1
+        ]
+
+    def add(self, label_num: int, delays: list[float], false_positives: int) -> None:
+        self.labels += label_num
+        self.delays.extend(delays)
+        self.false_positives += false_positives
+
+
+def random_script(rng: random.Random, offset: float, duration: float) -> list[Segment]:
+    def random_point() -> tuple[float, float]:
+        return rng.uniform(0.25, 0.75) + offset, rng.uniform(0.35, 0.7)
+
+    def travel(start: tuple[float, float], end: tuple[float, float]) -> list[Segment]:
+        return move(end, max(0.3, math.dist(start, end) / REPOSITION_SPEED))
+
+    current = random_point()
+    script = aim(current, 0.5)
+    total = 0.5
+    while total < duration:
+        action = rng.choices(
+            ('flick', 'reload', 'point', 'jitter', 'retarget', 'dropout'),
+            (6, 2, 1, 1, 1, 1),
+        )[0]
+        point = random_point()
+        if action == 'flick':
+            segments = (
+                travel(current, point)
+                + aim(point, rng.uniform(0.6, 1.2))
+                + flick(rng.uniform(0.4, 0.5), rng.uniform(0.12, 0.2))
+                + move(point, 0.4)
+            )
+        elif action == 'reload':
+            segments = reload(rng.uniform(0.5, 0.9)) + travel(current, point)
+        elif action == 'point':
+            segments = travel(current, point) + point_dwell(point, rng.uniform(1.6, 2.2))
+        elif action == 'jitter':
+            segments = travel(current, point) + jitter(rng.uniform(0.3, 0.8))
+        elif action == 'retarget':
+            # a quick, short retarget upwards must not count as a flick
+            low = (point[0], min(point[1] + 0.2, 0.8))
+            segments = travel(current, low) + aim(low, 0.6) + move(point, rng.uniform(0.3, 0.5))
+        else:
+            segments = dropout(rng.uniform(0.1, 0.3)) + travel(current, point)
+        current = point
+        script += segments
+        total += sum(segment.duration for segment in segments)
+    return script
+
+
+def generate_trace(seed: int) -> Trace:
+    rng = random.Random(seed)
+    hand_num = rng.choice((1, 1, 2))
+    config = StreamConfig(
+        fps=rng.choice((24, 30, 30)),
+        latency=rng.uniform(0.03, 0.08),
+        noise=rng.uniform(0.001, 0.003),
+        landmark_noise=rng.uniform(0.0002, 0.001),
+        dropout_rate=rng.choice((0, 0, 0.02, 0.05)),
+        seed=seed,
+    )
+    scripts = [
+        random_script(rng, (hand - (hand_num - 1) / 2) * 0.15, TRACE_DURATION)
+        for hand in range(hand_num)
+    ]
+    stream = SyntheticHandStream(scripts, config)
+    return Trace(config, hand_num, stream.labels, stream)
+
+
+corpus: list[Trace] | None = None
+corpus_seed = 0
+
+
+def init_worker(corpus_path: str | None, seed: int) -> None:
+    global corpus, corpus_seed
+    corpus_seed = seed
+    if corpus_path:
+        corpus = load_corpus(corpus_path)
+
+
+def open_corpus(path: str, mode: str = 'rt') -> Any:
+    return gzip.open(path, mode) if path.endswith('.gz') else open(path, mode)
+
+
+def load_corpus(path: str) -> list[Trace]:
+    with open_corpus(path) as f:
+        return [Trace.from_json(line) for line in f if line.strip()]
+
+
+def get_trace(index: int) -> Trace:
+    if corpus is not None:
+        return corpus[index]
+    return generate_trace(corpus_seed + index)
+
+
+def run_task(task: tuple[int, dict[str, Any], int]) -> tuple[int, dict[str, tuple]]:
+    config_index, params, trace_index = task
+    defaults = apply_params(params)
+    try:
+        trace = get_trace(trace_index)
+        events = detect_events(
+            trace.frames, trace.config, trace.hand_num, main.MediapipeManager.SHOOT_MODE
+        )
+        return config_index, {
+            kind: match_events(kind, times, trace.labels, SLACK)
+            for kind, times in events.items()
+        }
+    finally:
+        apply_params(defaults)
+
+
+def run_grid(
+    grid: list[dict[str, Any]],
+    trace_num: int,
+    corpus_path: str | None = None,
+    seed: int = 0,
+    workers: int | None = None,
+) -> list[dict[str, GestureStats]]:
+    tasks = [
+        (config_index, params, trace_index)
+        for config_index, params in enumerate(grid)
+        for trace_index in range(trace_num)
+    ]
+    workers = workers or os.cpu_count() or 1
+    chunksize = max(1, len(tasks) // (workers * 8))
+    results = [{kind: GestureStats() for kind in GESTURES} for _ in grid]
+    with Pool(workers, init_worker, (corpus_path, seed)) as pool:
+        for config_index, matches in pool.imap_unordered(run_task, tasks, chunksize):
+            for kind, match in matches.items():
+                results[config_index][kind].add(*match)
+    return results
+
+
+def summarize(params: dict[str, Any], stats: dict[str, GestureStats]) -> dict[str, Any]:
+    return {
+        'params': params,
+        'gestures': {
+            kind: {
+                'labels': gesture.labels,
+                'hits': gesture.hits,
+                'false_positives': gesture.false_positives,
+                'precision': gesture.precision,
+                'recall': gesture.recall,
+                'f1': gesture.f1,
+                'latency_mean': statistics.fmean(gesture.delays) if gesture.delays else 0,
+                'latency_p90': gesture.latency(0.9),
+            }
+            for kind, gesture in stats.items()
+        },
+    }
+
+
+def main_cli(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        '--param',
+        action='append',
+        default=[],
+        help='NAME=V1,V2,... where NAME is Class.ATTRIBUTE; use ; to separate tuple values',
+    )
+    parser.add_argument('--corpus', help='JSON Lines trace corpus, generated if omitted')
+    parser.add_argument('--traces', type=int, default=200, help='number of generated traces')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--write-corpus', help='write the generated traces and exit')
+    parser.add_argument(
+        '--rank', choices=GESTURES, default=None, help='sort configurations by F1 of a gesture'
+    )
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args(argv)
+
+    if args.write_corpus:
+        with open_corpus(args.write_corpus, 'wt') as f:
+            for index in range(args.traces):
+                f.write(generate_trace(args.seed + index).to_json() + '\n')
+        return 0
+
+    trace_num = len(load_corpus(args.corpus)) if args.corpus else args.traces
+    grid = parse_grid(args.param)
+    results = run_grid(grid, trace_num, args.corpus, args.seed, args.workers)
+    summaries = [summarize(params, stats) for params, stats in zip(grid, results)]
+    if args.rank:
+        summaries.sort(key=lambda summary: -summary['gestures'][args.rank]['f1'])
+    if args.json:
+        print(json.dumps({'traces': trace_num, 'results': summaries}, indent=2))
+        return 0
+    for summary in summaries:
+        print('{} ({} traces)'.format(summary['params'], trace_num))
+        for kind, gesture in summary['gestures'].items():
+            print(
+                '  {:7} labels {labels:5}  precision {precision:.3f}  recall {recall:.3f}  '
+                'f1 {f1:.3f}  latency {latency_mean:.3f}s (p90 {latency_p90:.3f}s)'.format(
+                    kind, **gesture
+                )
+            )
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main_cli(sys.argv[1:]))
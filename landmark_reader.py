@@ -0,0 +1,190 @@
+"""Reader for the shared-memory landmark stream of a running game.
+
+A native game started with App.EXPORT_NAME set publishes every ingested
+hand landmark result, with the outputs of the gesture detectors, into a
+ring of fixed-size slots in shared memory (see LandmarkExporter in
+main.py). Other processes attach by name and read without locks: a slot
+carries its sequence number only while it is complete, so a read that
+races the writer is detected and retried, e.g.
+
+    python landmark_reader.py obake-hands
+    python landmark_reader.py obake-hands --points
+
+or from code
+
+    with LandmarkReader('obake-hands') as reader:
+        for frame in reader.follow():
+            ...
+"""
+
+import argparse
+from dataclasses import dataclass
+from multiprocessing import resource_tracker, shared_memory
+import struct
+import sys
+import time
+from typing import Iterator
+
+from main import LandmarkExporter
+
+POLL_INTERVAL = 0.005
+READ_RETRIES = 8
+
+
+@dataclass
+class TrackFrame:
+    synthetic: bool
+    target: tuple[float, float]
+    mark: tuple[float, float] | None
+    shoot: tuple[float, float] | None
+    reload: bool
+    point: tuple[int, int] | None
+    point_time: float
+    # the dwell was long enough to select the point
+    selected: bool
+    points: list[tuple[float, float, float]]
+
+
+@dataclass
+class Frame:
+    sequence: int
+    video_time: float
+    # None where no hand was detected for the track
+    tracks: list[TrackFrame | None]
+
+
+class LandmarkReader:
+    def __init__(self, name: str) -> None:
+        try:
+            self.shm = shared_memory.SharedMemory(name, track=False)
+        except TypeError:
+            # before Python 3.13 every attached process registers the segment
+            # and its resource tracker would unlink it on exit
+            self.shm = shared_memory.SharedMemory(name)
+            resource_tracker.unregister(self.shm._name, 'shared_memory')
+        magic, version, self.slot_count, self.slot_size, self.track_count, _ = (
+            LandmarkExporter.HEADER.unpack_from(self.shm.buf)
+        )
+        if magic != LandmarkExporter.MAGIC or version != LandmarkExporter.VERSION:
+            self.shm.close()
+            raise ValueError(
+                '{} is not a landmark stream of version {}'.format(
+                    name, LandmarkExporter.VERSION
+                )
+            )
+        self.sequence = self.latest()
+        self.dropped = 0
+
+    def latest(self) -> int:
+        return struct.unpack_from('<Q', self.shm.buf, LandmarkExporter.SEQUENCE_OFFSET)[0]
+
+    def read(self, sequence: int) -> Frame | None:
+        # None once the slot has been overwritten by a newer frame
+        offset = LandmarkExporter.HEADER.size + sequence % self.slot_count * self.slot_size
+        for _ in range(READ_RETRIES):
+            data = bytes(self.shm.buf[offset:offset + self.slot_size])
+            slot_sequence, video_time = LandmarkExporter.SLOT_HEADER.unpack_from(data)
+            if slot_sequence != sequence and slot_sequence != 0:
+                return None
+            check = LandmarkExporter.SLOT_HEADER.unpack_from(self.shm.buf, offset)[0]
+            if slot_sequence == sequence and check == sequence:
+                return Frame(sequence, video_time, self.unpack_tracks(data))
+        return None
+
+    def unpack_tracks(self, data: bytes) -> list[TrackFrame | None]:
+        tracks: list[TrackFrame | None] = []
+        for offset in range(
+            LandmarkExporter.SLOT_HEADER.size, len(data), LandmarkExporter.TRACK.size
+        ):
+            values = LandmarkExporter.TRACK.unpack_from(data, offset)
+            flags = values[0]
+            if not flags & LandmarkExporter.PRESENT:
+                tracks.append(None)
+                continue
+            points = values[10:]
+            tracks.append(
+                TrackFrame(
+                    bool(flags & LandmarkExporter.SYNTHETIC),
+                    values[1:3],
+                    values[3:5] if flags & LandmarkExporter.MARK else None,
+                    values[5:7] if flags & LandmarkExporter.SHOOT else None,
+                    bool(flags & LandmarkExporter.RELOAD),
+                    values[7:9] if flags & LandmarkExporter.POINT else None,
+                    values[9],
+                    bool(flags & LandmarkExporter.SELECTED),
+                    [points[i:i + 3] for i in range(0, len(points), 3)],
+                )
+            )
+        return tracks
+
+    def poll(self) -> list[Frame]:
+        # frames published since the last poll, oldest first; frames the
+        # writer already overwrote are counted in dropped
+        latest = self.latest()
+        frames = []
+        if latest - self.sequence > self.slot_count:
+            self.dropped += latest - self.sequence - self.slot_count
+            self.sequence = latest - self.slot_count
+        while self.sequence < latest:
+            self.sequence += 1
+            frame = self.read(self.sequence)
+            if frame is None:
+                self.dropped += 1
+            else:
+                frames.append(frame)
+        return frames
+
+    def follow(self, interval: float = POLL_INTERVAL) -> Iterator[Frame]:
+        while True:
+            frames = self.poll()
+            yield from frames
+            if not frames:
+                time.sleep(interval)
+
+    def close(self) -> None:
+        self.shm.close()
+
+    def __enter__(self) -> 'LandmarkReader':
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+
+def describe(frame: Frame, points: bool) -> str:
+    parts = ['#{} {:.3f}s'.format(frame.sequence, frame.video_time)]
+    for track_id, track in enumerate(frame.tracks):
+        if track is None:
+            continue
+        text = '{}: ({:.3f}, {:.3f})'.format(track_id, *track.target)
+        if track.shoot:
+            text += ' shoot'
+        if track.reload:
+            text += ' reload'
+        if track.point:
+            text += ' point {:.1f}s'.format(track.point_time)
+        if track.selected:
+            text += ' selected'
+        if points:
+            text += ' ' + ' '.join('{:.3f},{:.3f}'.format(x, y) for x, y, _ in track.points)
+        parts.append(text)
+    return '  '.join(parts)
+
+
+def main_cli(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('name', help='shared memory name, App.EXPORT_NAME of the game')
+    parser.add_argument('--points', action='store_true', help='print the landmarks too')
+    args = parser.parse_args(argv)
+    with LandmarkReader(args.name) as reader:
+        try:
+            for frame in reader.follow():
+                print(describe(frame, args.points))
+        except KeyboardInterrupt:
+            pass
+        print('dropped {}'.format(reader.dropped))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main_cli(sys.argv[1:]))
@@ -1,13 +1,46 @@
-from collections import deque
+import asyncio
+from array import array
+import atexit
+from bisect import bisect_right
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+import errno
+import gc
+import itertools
+import json
+import math
 import random
-from typing import Any
+import secrets
+import select
+import socket
+import struct
+import sys
+import threading
+import time
+import tracemalloc
+from typing import Any, Iterator
+import zlib
 
 import pyxel
 
-import js
+try:
+    import js
+except ImportError:
+    js = None
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 WINDOW_W = 256
 WINDOW_H = 256
+FPS = 30
+
+BOOT_TIME = time.perf_counter()
+
+IS_BROWSER = sys.platform == 'emscripten'
 
 
 def distance(a: list[float], b: list[float]) -> float:
@@ -18,7 +51,671 @@ def subtraction(a: list[float], b: list[float]) -> list[float]:
     return [x - y for x, y in zip(a, b)]
 
 
+class PyxelRenderer:
+    def begin_frame(self) -> None:
+        pass
+
+    def end_frame(self) -> None:
+        pass
+
+    def cls(self, col: int) -> None:
+        pyxel.cls(col)
+
+    def blt(self, x, y, img, u, v, w, h, colkey=None) -> None:
+        if colkey is None:
+            pyxel.blt(x, y, img, u, v, w, h)
+        else:
+            pyxel.blt(x, y, img, u, v, w, h, colkey)
+
+    def circ(self, x, y, r, col) -> None:
+        pyxel.circ(x, y, r, col)
+
+    def circb(self, x, y, r, col) -> None:
+        pyxel.circb(x, y, r, col)
+
+    def text(self, x, y, s, col) -> None:
+        pyxel.text(x, y, s, col)
+
+    def dither(self, alpha) -> None:
+        pyxel.dither(alpha)
+
+    def pal(self, col1=None, col2=None) -> None:
+        if col1 is None:
+            pyxel.pal()
+        else:
+            pyxel.pal(col1, col2)
+
+    def camera(self, x=None, y=None) -> None:
+        if x is None:
+            pyxel.camera()
+        else:
+            pyxel.camera(x, y)
+
+
+class RecordingRenderer:
+    COMMANDS = ('cls', 'blt', 'circ', 'circb', 'text', 'dither', 'pal', 'camera')
+    MAX_FRAMES = 600
+
+    def __init__(self, inner: Any = None) -> None:
+        self.inner = inner
+        self.commands: list[tuple] = []
+        self.frames: deque[list[tuple]] = deque(maxlen=self.MAX_FRAMES)
+        for name in self.COMMANDS:
+            setattr(self, name, self.recorder(name))
+
+    def recorder(self, name: str) -> Any:
+        def record(*args) -> None:
+            self.commands.append((name, *args))
+            if self.inner is not None:
+                getattr(self.inner, name)(*args)
+
+        return record
+
+    def begin_frame(self) -> None:
+        if self.inner is not None:
+            self.inner.begin_frame()
+
+    def end_frame(self) -> None:
+        self.frames.append(self.commands)
+        self.commands = []
+        if self.inner is not None:
+            self.inner.end_frame()
+
+    def last_frame(self) -> list[tuple]:
+        return self.frames[-1] if self.frames else []
+
+    def draw_count(self, frame: list[tuple] | None = None) -> int:
+        if frame is None:
+            frame = self.last_frame()
+        return sum(1 for command in frame if command[0] in ('blt', 'circ', 'circb', 'text'))
+
+
+class ChangeTrackingRenderer:
+    # while enabled, buffers the commands of a frame and forwards them only when
+    # they differ from the last forwarded frame; pyxel keeps the previous screen
+    def __init__(self, inner: Any) -> None:
+        self.inner = inner
+        self.enabled = False
+        self.in_frame = False
+        self.commands: list[tuple] = []
+        self.last_commands: list[tuple] | None = None
+        self.skipped_frames = 0
+        for name in RecordingRenderer.COMMANDS:
+            setattr(self, name, self.tracker(name))
+
+    def tracker(self, name: str) -> Any:
+        forward = getattr(self.inner, name)
+
+        def track(*args) -> None:
+            if self.enabled and self.in_frame:
+                self.commands.append((name, *args))
+                return
+            # e.g. a camera reset from update, the next frame must be drawn over it
+            forward(*args)
+            self.invalidate()
+
+        return track
+
+    def invalidate(self) -> None:
+        self.last_commands = None
+
+    def begin_frame(self) -> None:
+        self.in_frame = True
+        self.inner.begin_frame()
+
+    def end_frame(self) -> None:
+        self.in_frame = False
+        if not self.enabled:
+            self.last_commands = None
+        elif self.commands == self.last_commands:
+            self.skipped_frames += 1
+        else:
+            for name, *args in self.commands:
+                getattr(self.inner, name)(*args)
+            self.last_commands = self.commands
+        self.commands = []
+        self.inner.end_frame()
+
+
+class SoftwareRenderer:
+    FONT_W = 4
+    FONT_H = 6
+    FONT_CHARS = ''.join(chr(c) for c in range(32, 127))
+    # pyxel's 4x4 ordered dithering matrix
+    DITHER_MATRIX = ((0, 8, 2, 10), (12, 4, 14, 6), (3, 11, 1, 9), (15, 7, 13, 5))
+
+    font = None
+
+    def __init__(self, width: int = WINDOW_W, height: int = WINDOW_H) -> None:
+        if np is None:
+            raise RuntimeError('SoftwareRenderer requires numpy')
+        self.width = width
+        self.height = height
+        self.framebuffer = np.zeros((height, width), dtype=np.uint8)
+        self.ys, self.xs = np.mgrid[0:height, 0:width]
+        self.dither_threshold = (
+            np.array(self.DITHER_MATRIX, dtype=np.float32)[self.ys % 4, self.xs % 4] / 16
+        )
+        self.reset_state()
+        self.load_font()
+
+    def reset_state(self) -> None:
+        self.palette = np.arange(256, dtype=np.uint8)
+        self.alpha = 1.0
+        self.camera_x = 0
+        self.camera_y = 0
+
+    @classmethod
+    def load_font(cls):
+        if cls.font is None:
+            image = pyxel.Image(cls.FONT_W * len(cls.FONT_CHARS), cls.FONT_H)
+            image.cls(0)
+            image.text(0, 0, cls.FONT_CHARS, 1)
+            pixels = np.array(
+                [
+                    [image.pget(x, y) for x in range(image.width)]
+                    for y in range(cls.FONT_H)
+                ],
+                dtype=bool,
+            )
+            cls.font = {
+                c: pixels[:, i * cls.FONT_W : (i + 1) * cls.FONT_W]
+                for i, c in enumerate(cls.FONT_CHARS)
+            }
+
+    @staticmethod
+    def image_bank(img: int) -> Any:
+        image = pyxel.images[img]
+        data = np.ctypeslib.as_array(image.data_ptr())
+        return data.reshape(image.height, image.width)
+
+    def begin_frame(self) -> None:
+        pass
+
+    def end_frame(self) -> None:
+        pass
+
+    def replay(self, commands: list[tuple]) -> Any:
+        for name, *args in commands:
+            getattr(self, name)(*args)
+        return self.framebuffer
+
+    def plot(self, x: int, y: int, pixels: Any, mask: Any) -> None:
+        x -= self.camera_x
+        y -= self.camera_y
+        h, w = pixels.shape
+        x0, y0 = max(x, 0), max(y, 0)
+        x1, y1 = min(x + w, self.width), min(y + h, self.height)
+        if x0 >= x1 or y0 >= y1:
+            return
+        pixels = pixels[y0 - y : y1 - y, x0 - x : x1 - x]
+        mask = mask[y0 - y : y1 - y, x0 - x : x1 - x]
+        if self.alpha < 1:
+            mask = mask & (self.dither_threshold[y0:y1, x0:x1] < self.alpha)
+        target = self.framebuffer[y0:y1, x0:x1]
+        target[mask] = self.palette[pixels[mask]]
+
+    def cls(self, col: int) -> None:
+        self.framebuffer[:] = self.palette[col]
+
+    def blt(self, x, y, img, u, v, w, h, colkey=None) -> None:
+        bank = self.image_bank(img)
+        u, v = int(u), int(v)
+        pixels = bank[v : v + abs(int(h)), u : u + abs(int(w))]
+        if w < 0:
+            pixels = pixels[:, ::-1]
+        if h < 0:
+            pixels = pixels[::-1, :]
+        if colkey is None:
+            mask = np.ones(pixels.shape, dtype=bool)
+        else:
+            mask = pixels != colkey
+        self.plot(int(x), int(y), pixels, mask)
+
+    def circle_mask(self, r: int, border: bool) -> Any:
+        ys, xs = np.mgrid[-r : r + 1, -r : r + 1]
+        d2 = xs * xs + ys * ys
+        mask = d2 <= r * r + r
+        if border and r > 0:
+            mask &= d2 > (r - 1) * (r - 1) + (r - 1)
+        return mask
+
+    def circ(self, x, y, r, col) -> None:
+        r = int(round(r))
+        mask = self.circle_mask(r, False)
+        pixels = np.full(mask.shape, col, dtype=np.uint8)
+        self.plot(int(round(x)) - r, int(round(y)) - r, pixels, mask)
+
+    def circb(self, x, y, r, col) -> None:
+        r = int(round(r))
+        mask = self.circle_mask(r, True)
+        pixels = np.full(mask.shape, col, dtype=np.uint8)
+        self.plot(int(round(x)) - r, int(round(y)) - r, pixels, mask)
+
+    def text(self, x, y, s, col) -> None:
+        x, y = int(x), int(y)
+        left = x
+        for c in str(s):
+            if c == '\n':
+                x = left
+                y += self.FONT_H
+                continue
+            glyph = self.font.get(c)
+            if glyph is not None:
+                pixels = np.full(glyph.shape, col, dtype=np.uint8)
+                self.plot(x, y, pixels, glyph)
+            x += self.FONT_W
+
+    def dither(self, alpha) -> None:
+        self.alpha = alpha
+
+    def pal(self, col1=None, col2=None) -> None:
+        if col1 is None:
+            self.palette = np.arange(256, dtype=np.uint8)
+        else:
+            self.palette[col1] = col2
+
+    def camera(self, x=None, y=None) -> None:
+        self.camera_x = int(x or 0)
+        self.camera_y = int(y or 0)
+
+
+renderer = PyxelRenderer()
+
+
+def set_renderer(new_renderer: Any) -> None:
+    global renderer
+    renderer = new_renderer
+
+
+class QualityGovernor:
+    LEVELS = (
+        {
+            'particle_interval': 1,
+            'dead_fade': True,
+            'shake': True,
+            'hand_skeleton': True,
+            'appear_fade': True,
+        },
+        {
+            'particle_interval': 2,
+            'dead_fade': True,
+            'shake': True,
+            'hand_skeleton': False,
+            'appear_fade': True,
+        },
+        {
+            'particle_interval': 3,
+            'dead_fade': False,
+            'shake': False,
+            'hand_skeleton': False,
+            'appear_fade': True,
+        },
+        {
+            'particle_interval': 6,
+            'dead_fade': False,
+            'shake': False,
+            'hand_skeleton': False,
+            'appear_fade': False,
+        },
+    )
+    FRAME_BUDGET = 1 / FPS
+    DETECTION_BUDGET = 0.1
+    SMOOTHING = 0.05
+    DEGRADE_LOAD = 1.15
+    RECOVER_LOAD = 0.85
+    DEGRADE_FRAMES = 30
+    RECOVER_FRAMES = 150
+
+    level = 0
+    load = 1.0
+    last_time = None
+    degrade_count = 0
+    recover_count = 0
+
+    @classmethod
+    def update(cls, detection_interval: float):
+        now = time.perf_counter()
+        if cls.last_time is None:
+            cls.last_time = now
+            return
+        frame_time = now - cls.last_time
+        cls.last_time = now
+        load = max(
+            frame_time / cls.FRAME_BUDGET, detection_interval / cls.DETECTION_BUDGET
+        )
+        cls.load += (load - cls.load) * cls.SMOOTHING
+
+        if cls.load > cls.DEGRADE_LOAD and cls.level < len(cls.LEVELS) - 1:
+            cls.degrade_count += 1
+            cls.recover_count = 0
+            if cls.degrade_count >= cls.DEGRADE_FRAMES:
+                cls.set_level(cls.level + 1)
+        elif cls.load < cls.RECOVER_LOAD and cls.level > 0:
+            cls.recover_count += 1
+            cls.degrade_count = 0
+            if cls.recover_count >= cls.RECOVER_FRAMES:
+                cls.set_level(cls.level - 1)
+        else:
+            cls.degrade_count = 0
+            cls.recover_count = 0
+
+    @classmethod
+    def reset_clock(cls):
+        # frames were deliberately skipped, do not count the gap as load
+        cls.last_time = None
+
+    @classmethod
+    def set_level(cls, level: int):
+        cls.level = level
+        cls.degrade_count = 0
+        cls.recover_count = 0
+
+    @classmethod
+    def setting(cls, name: str) -> Any:
+        return cls.LEVELS[cls.level][name]
+
+
+class ProfileSection:
+    def __init__(self, profiler: 'FrameProfiler', name: str) -> None:
+        self.profiler = profiler
+        self.name = name
+        self.previous = None
+        self.start_memory = 0
+        self.start_time = 0.0
+
+    def __enter__(self) -> None:
+        self.previous = self.profiler.current
+        self.profiler.current = self.name
+        tracemalloc.reset_peak()
+        self.start_memory = tracemalloc.get_traced_memory()[0]
+        self.start_time = time.perf_counter()
+
+    def __exit__(self, *exc_info) -> None:
+        elapsed = time.perf_counter() - self.start_time
+        memory, peak = tracemalloc.get_traced_memory()
+        self.profiler.record(
+            self.name, elapsed, peak - self.start_memory, memory - self.start_memory
+        )
+        self.profiler.current = self.previous
+
+
+class FrameProfiler:
+    # sections must not nest, each one resets the tracemalloc peak
+    REPORT_INTERVAL = FPS * 5
+    NULL_SECTION = nullcontext()
+
+    def __init__(self, report_interval: int | None = None) -> None:
+        self.report_interval = report_interval or self.REPORT_INTERVAL
+        self.enabled = False
+        self.frame = 0
+        self.current = None
+        self.gc_start = 0.0
+        self.stats = {}
+
+    def enable(self):
+        if self.enabled:
+            return
+        tracemalloc.start()
+        gc.callbacks.append(self.on_gc)
+        self.enabled = True
+        self.stats = {}
+
+    def disable(self):
+        if not self.enabled:
+            return
+        gc.callbacks.remove(self.on_gc)
+        tracemalloc.stop()
+        self.enabled = False
+
+    def section(self, name: str) -> Any:
+        if not self.enabled:
+            return self.NULL_SECTION
+        return ProfileSection(self, name)
+
+    def section_stats(self, name: str) -> dict[str, float]:
+        if name not in self.stats:
+            self.stats[name] = {
+                'calls': 0,
+                'time': 0.0,
+                'max_time': 0.0,
+                'allocated': 0,
+                'max_allocated': 0,
+                'retained': 0,
+                'gc_count': 0,
+                'gc_time': 0.0,
+                'max_gc_time': 0.0,
+            }
+        return self.stats[name]
+
+    def record(self, name: str, elapsed: float, allocated: int, retained: int):
+        stats = self.section_stats(name)
+        stats['calls'] += 1
+        stats['time'] += elapsed
+        stats['max_time'] = max(stats['max_time'], elapsed)
+        stats['allocated'] += allocated
+        stats['max_allocated'] = max(stats['max_allocated'], allocated)
+        stats['retained'] += retained
+
+    def on_gc(self, phase: str, info: dict):
+        if phase == 'start':
+            self.gc_start = time.perf_counter()
+            return
+        pause = time.perf_counter() - self.gc_start
+        stats = self.section_stats(self.current or 'other')
+        stats['gc_count'] += 1
+        stats['gc_time'] += pause
+        stats['max_gc_time'] = max(stats['max_gc_time'], pause)
+
+    def end_frame(self):
+        if not self.enabled:
+            return
+        self.frame += 1
+        if self.frame % self.report_interval == 0:
+            self.report()
+            self.stats = {}
+
+    def report(self):
+        print('profile: {} frames'.format(self.report_interval))
+        for name, stats in self.stats.items():
+            frames = self.report_interval
+            print(
+                '  {:10} {:6.2f}ms/frame (max {:6.2f}ms)  '
+                'alloc {:7.1f}KiB/frame (max {:7.1f}KiB)  retained {:+8.1f}KiB  '
+                'gc {:3} (max {:5.2f}ms)'.format(
+                    name,
+                    stats['time'] / frames * 1000,
+                    stats['max_time'] * 1000,
+                    stats['allocated'] / frames / 1024,
+                    stats['max_allocated'] / 1024,
+                    stats['retained'] / 1024,
+                    stats['gc_count'],
+                    stats['max_gc_time'] * 1000,
+                )
+            )
+
+
+class GCScheduler:
+    # automatic collection is suspended while playing, garbage is collected
+    # on scene transitions and idle title/result frames instead
+    IDLE_COLLECT_INTERVAL = FPS * 2
+    MAX_YOUNG_OBJECTS = 50000
+
+    def __init__(self, enabled: bool = True) -> None:
+        self.enabled = enabled
+        self.suspended = False
+        self.idle_count = 0
+
+    def suspend(self):
+        if not self.enabled or self.suspended:
+            return
+        gc.collect()
+        gc.freeze()
+        gc.disable()
+        self.suspended = True
+
+    def resume(self):
+        if not self.suspended:
+            return
+        gc.unfreeze()
+        gc.collect()
+        gc.enable()
+        self.suspended = False
+
+    def update(self, idle: bool):
+        if self.suspended:
+            # bound memory growth with a cheap young collection
+            if gc.get_count()[0] > self.MAX_YOUNG_OBJECTS:
+                gc.collect(0)
+            return
+        if not self.enabled or not idle:
+            self.idle_count = 0
+            return
+        self.idle_count += 1
+        if self.idle_count % self.IDLE_COLLECT_INTERVAL == 0:
+            gc.collect()
+
+    def checkpoint(self):
+        # a pause in play, e.g. between waves, where a middle collection is affordable
+        if self.suspended:
+            gc.collect(1)
+
+
+class PowerManager:
+    # after IDLE_TIME seconds on title/result with no hand and no mouse input the
+    # game only updates every LOW_POWER_INTERVAL frames and detects less often;
+    # a new hand is seen within 1 / LOW_POWER_DETECTION_RATE seconds
+    IDLE_TIME = 30
+    LOW_POWER_INTERVAL = 6
+    LOW_POWER_DETECTION_RATE = 5
+
+    def __init__(self, enabled: bool = True) -> None:
+        self.enabled = enabled
+        self.low_power = False
+        self.idle_count = 0
+        self.frame_count = 0
+        self.mouse = None
+        self.mouse_active = False
+
+    def update(self, active: bool) -> bool:
+        # whether this frame runs its update
+        mouse = (pyxel.mouse_x, pyxel.mouse_y)
+        self.mouse_active = mouse != self.mouse or any(
+            pyxel.btn(button)
+            for button in (pyxel.MOUSE_BUTTON_LEFT, pyxel.MOUSE_BUTTON_RIGHT)
+        )
+        self.mouse = mouse
+        if not self.enabled or active or self.mouse_active:
+            self.wake()
+            return True
+        self.idle_count += 1
+        if self.idle_count < self.IDLE_TIME * FPS:
+            return True
+        self.low_power = True
+        self.frame_count += 1
+        return self.frame_count % self.LOW_POWER_INTERVAL == 0
+
+    def wake(self):
+        if self.low_power:
+            QualityGovernor.reset_clock()
+        self.low_power = False
+        self.idle_count = 0
+        self.frame_count = 0
+
+
+class StateWriter:
+    # little-endian fields appended in the order the matching StateReader reads them
+    def __init__(self) -> None:
+        self.data = bytearray()
+
+    def pack(self, fmt: str, *values: Any) -> None:
+        self.data += struct.pack('<' + fmt, *values)
+
+    def write(self, data: bytes) -> None:
+        self.data += data
+
+    def pack_vector(self, values: list[float] | None) -> None:
+        values = values or []
+        self.pack('B{}d'.format(len(values)), len(values), *values)
+
+    def pack_text(self, text: str) -> None:
+        data = text.encode()
+        self.pack('B', len(data))
+        self.write(data)
+
+
+class StateReader:
+    def __init__(self, data: bytes) -> None:
+        self.data = data
+        self.offset = 0
+
+    def unpack(self, fmt: str) -> tuple:
+        fmt = struct.Struct('<' + fmt)
+        values = fmt.unpack_from(self.data, self.offset)
+        self.offset += fmt.size
+        return values
+
+    def read(self, size: int) -> bytes:
+        data = self.data[self.offset : self.offset + size]
+        self.offset += size
+        return data
+
+    def unpack_vector(self) -> list[float]:
+        (length,) = self.unpack('B')
+        return list(self.unpack('{}d'.format(length)))
+
+    def unpack_text(self) -> str:
+        (length,) = self.unpack('B')
+        return bytes(self.read(length)).decode()
+
+
+class RandomStreams:
+    # one independent generator per subsystem, so cosmetic draws never shift gameplay
+    MAX_SEED = 2**31
+    MT_STATE_SIZE = 625
+
+    def __init__(self, seed: int | None = None) -> None:
+        # user seeds are reduced too, the seed is logged in a 32-bit event field
+        self.seed = (seed if seed is not None else time.time_ns()) % self.MAX_SEED
+        self.streams: dict[str, random.Random] = {}
+
+    def stream(self, name: str) -> random.Random:
+        rng = self.streams.get(name)
+        if rng is None:
+            rng = self.streams[name] = random.Random('{}:{}'.format(self.seed, name))
+        return rng
+
+    def reset(self) -> None:
+        for name, rng in self.streams.items():
+            rng.seed('{}:{}'.format(self.seed, name))
+
+    def save_state(self, writer: StateWriter) -> None:
+        writer.pack('B', len(self.streams))
+        for name, rng in self.streams.items():
+            version, internal, gauss_next = rng.getstate()
+            writer.pack_text(name)
+            if gauss_next is None:
+                gauss_next = math.nan
+            writer.pack('{}Id'.format(self.MT_STATE_SIZE), *internal, gauss_next)
+
+    def load_state(self, reader: StateReader) -> None:
+        (stream_num,) = reader.unpack('B')
+        for _ in range(stream_num):
+            name = reader.unpack_text()
+            *internal, gauss_next = reader.unpack('{}Id'.format(self.MT_STATE_SIZE))
+            gauss_next = None if math.isnan(gauss_next) else gauss_next
+            self.stream(name).setstate((3, tuple(internal), gauss_next))
+
+
 class Hand:
+    THUMB_MCP = 2
+    THUMB_IP = 3
+    THUMB_TIP = 4
+    INDEX_FINGER_MCP = 5
+    INDEX_FINGER_TIP = 8
+    MIDDLE_FINGER_TIP = 12
+    RING_FINGER_PIP = 14
+
     POINT_SIZE = 7
     POINT_COLOR = 7
 
@@ -36,18 +733,47 @@ class Hand:
             x, y = x + 0.5, y + 0.5
             self.points.append([1 - x, y, z])
         self.time = time
+        self.synthetic = False
 
         self.target = self.calc_target(sens)
 
+    @classmethod
+    def from_points(
+        cls, points: list[list[float]], sens: float, time: float, synthetic: bool = False
+    ) -> 'Hand':
+        hand = cls.__new__(cls)
+        hand.points = points
+        hand.time = time
+        hand.synthetic = synthetic
+        hand.target = hand.calc_target(sens)
+        return hand
+
+    def save_state(self, writer: StateWriter) -> None:
+        # landmarks are float32 in MediaPipe already
+        writer.pack('B', len(self.points))
+        writer.write(array('f', [v for point in self.points for v in point]).tobytes())
+        writer.pack('d?2d', self.time, self.synthetic, *self.target)
+
+    @classmethod
+    def from_state(cls, reader: StateReader) -> 'Hand':
+        (point_num,) = reader.unpack('B')
+        values = array('f')
+        values.frombytes(reader.read(4 * 3 * point_num))
+        hand = cls.__new__(cls)
+        hand.points = [list(values[i : i + 3]) for i in range(0, len(values), 3)]
+        hand.time, hand.synthetic, *hand.target = reader.unpack('d?2d')
+        return hand
+
     def draw(self) -> None:
-        for point in self.points:
-            pyxel.circ(
-                point[0] * WINDOW_W,
-                point[1] * WINDOW_H,
-                self.POINT_SIZE,
-                self.POINT_COLOR,
-            )
-        pyxel.circ(
+        if QualityGovernor.setting('hand_skeleton'):
+            for point in self.points:
+                renderer.circ(
+                    point[0] * WINDOW_W,
+                    point[1] * WINDOW_H,
+                    self.POINT_SIZE,
+                    self.POINT_COLOR,
+                )
+        renderer.circ(
             self.target[0] * WINDOW_W,
             self.target[1] * WINDOW_H,
             self.TARGET_SIZE,
@@ -80,6 +806,18 @@ class Hand:
     def ring_finger_pip_point(self) -> list[float]:
         return self.points[14]
 
+    def pair_distances(self, pairs: list[tuple[int, int]]) -> list[float]:
+        points = self.points
+        return [math.dist(points[a], points[b]) for a, b in pairs]
+
+    @staticmethod
+    def batch_pair_distances(
+        hands: list['Hand'], pairs: list[tuple[int, int]]
+    ) -> list[list[float]]:
+        return [
+            [math.dist(hand.points[a], hand.points[b]) for a, b in pairs] for hand in hands
+        ]
+
     def calc_target(self, sens) -> list[float]:
         target_vector = []
         for base, vector in zip(self.index_finger_base(), self.index_finger_vector()):
@@ -103,28 +841,35 @@ class CrossHairImage:
         pyxel.images[self.I].load(self.U, self.V, self.ASSET_FILE)
 
     def draw(self, x: int, y: int) -> None:
-        pyxel.blt(x, y, self.I, self.U, self.V, self.W, self.H, self.COLKEY)
+        renderer.blt(x, y, self.I, self.U, self.V, self.W, self.H, self.COLKEY)
 
 
 class ShootDetector:
+    cross_hair_image = None
+
     SHOOT_DETECTION_LENGTH = 0.25
     MARK_DETECTION_ACCURACY = 0.05
     MARK_DETECTION_TIME = 0.5
     MARK_ACTIVE_TIME = 1
 
-    def __init__(self) -> None:
-        self.cross_hair_image = CrossHairImage()
+    LABEL_COLOR = 7
+
+    def __init__(self, label: str = '') -> None:
+        self.label = label
         self.position: list[float] | None = None
         self.mark: list[float] | None = None
         self.shoot_flag = False
         self.mark_time  = -1
+        self.shoot_age = 0
 
     def update(self) -> None:
         self.shoot_flag = False
 
     def detect(self, hand_history: list[Hand]) -> None:
         self.update_mark(hand_history)
-        self.detect_shoot(hand_history[-1])
+        # filled-in samples keep the mark alive but never fire a shot
+        if not hand_history[-1].synthetic:
+            self.detect_shoot(hand_history[-1])
 
     def update_mark(self, hand_history: list[Hand]) -> None:
         current = hand_history[-1]
@@ -147,36 +892,260 @@ class ShootDetector:
             return
         if self.mark[1] - current.target[1] > self.SHOOT_DETECTION_LENGTH:
             self.position = self.mark
+            self.shoot_age = current.time - self.mark_time
             self.mark = None
             self.shoot_flag = True
 
     def is_shoot(self) -> bool:
         return self.shoot_flag
 
+    def save_state(self, writer: StateWriter) -> None:
+        writer.pack_vector(self.position)
+        writer.pack_vector(self.mark)
+        writer.pack('?dd', self.shoot_flag, self.mark_time, self.shoot_age)
+
+    def load_state(self, reader: StateReader) -> None:
+        self.position = reader.unpack_vector() or None
+        self.mark = reader.unpack_vector() or None
+        self.shoot_flag, self.mark_time, self.shoot_age = reader.unpack('?dd')
+
     def shoot_position(self) -> list[float]:
         return self.position
 
+    def shoot_position_age(self) -> float:
+        return self.shoot_age
+
+    @classmethod
+    def load(cls):
+        if cls.cross_hair_image is None:
+            cls.cross_hair_image = CrossHairImage()
+
     def draw(self):
+        self.load()
         if self.mark is not None:
             x = self.mark[0] * WINDOW_W - CrossHairImage.W // 2
             y = self.mark[1] * WINDOW_H - CrossHairImage.H // 2
             self.cross_hair_image.draw(x, y)
+            if self.label:
+                renderer.text(x + CrossHairImage.W, y, self.label, self.LABEL_COLOR)
+
+
+class VelocityShootDetector(ShootDetector):
+    # alpha-beta filter over the target, in screen units per second
+    ALPHA = 0.85
+    BETA = 0.6
+    MAX_GAP = 0.2
+
+    ONSET_VELOCITY = 1.2
+    ONSET_ACCELERATION = 20
+    MIN_DISPLACEMENT = 0.05
+    MAX_HORIZONTAL_RATIO = 0.8
+    # the onset has to last this long, a single jump of the target is not a flick
+    CONFIRM_TIME = 0.03
+
+    def __init__(self, label: str = '') -> None:
+        super().__init__(label)
+        self.reset_filter()
+
+    def reset_filter(self, hand: Hand | None = None) -> None:
+        self.filter_time = hand.time if hand else -1
+        self.estimate = list(hand.target) if hand else [0.0, 0.0]
+        self.velocity = [0.0, 0.0]
+        self.acceleration = 0.0
+        self.rise = 0.0
+        self.onset_time = -1
+
+    def detect(self, hand_history: list[Hand]) -> None:
+        if not hand_history[-1].synthetic:
+            self.update_filter(hand_history[-1])
+        super().detect(hand_history)
+
+    def update_filter(self, hand: Hand) -> None:
+        dt = hand.time - self.filter_time
+        if self.filter_time < 0 or not 0 < dt < self.MAX_GAP:
+            self.reset_filter(hand)
+            return
+        self.filter_time = hand.time
+        # how far the target got above the prediction, positive while a flick speeds up
+        self.rise = self.estimate[1] + self.velocity[1] * dt - hand.target[1]
+        previous_velocity = self.velocity[1]
+        for i in range(2):
+            predicted = self.estimate[i] + self.velocity[i] * dt
+            residual = hand.target[i] - predicted
+            self.estimate[i] = predicted + self.ALPHA * residual
+            self.velocity[i] += self.BETA * residual / dt
+        self.acceleration = (self.velocity[1] - previous_velocity) / dt
+
+    def save_state(self, writer: StateWriter) -> None:
+        super().save_state(writer)
+        writer.pack(
+            '7d',
+            self.filter_time,
+            *self.estimate,
+            *self.velocity,
+            self.acceleration,
+            self.rise,
+        )
+        writer.pack('d', self.onset_time)
+
+    def load_state(self, reader: StateReader) -> None:
+        super().load_state(reader)
+        values = reader.unpack('7d')
+        self.filter_time = values[0]
+        self.estimate = list(values[1:3])
+        self.velocity = list(values[3:5])
+        self.acceleration, self.rise = values[5:7]
+        (self.onset_time,) = reader.unpack('d')
+
+    def is_onset(self, current: Hand) -> bool:
+        upward = -self.velocity[1]
+        if self.mark[1] - current.target[1] < self.MIN_DISPLACEMENT or self.rise <= 0:
+            return False
+        if abs(self.velocity[0]) > upward * self.MAX_HORIZONTAL_RATIO:
+            return False
+        return upward > self.ONSET_VELOCITY or (
+            upward > self.ONSET_VELOCITY / 2 and -self.acceleration > self.ONSET_ACCELERATION
+        )
+
+    def detect_shoot(self, current: Hand) -> None:
+        if self.mark is None:
+            self.onset_time = -1
+            return
+        if not self.is_onset(current):
+            self.onset_time = -1
+        elif self.onset_time < 0:
+            self.onset_time = current.time
+        elif current.time - self.onset_time >= self.CONFIRM_TIME:
+            self.position = self.mark
+            self.shoot_age = current.time - self.mark_time
+            self.mark = None
+            self.shoot_flag = True
+            self.onset_time = -1
+            return
+        super().detect_shoot(current)
+
+
+class GestureRule:
+    def __init__(
+        self,
+        name: str,
+        conditions: tuple[tuple[int, int, str, float], ...],
+        hold_time: float = 0,
+        cooldown: float = 0,
+    ) -> None:
+        self.name = name
+        self.conditions = conditions
+        self.hold_time = hold_time
+        self.cooldown = cooldown
+
+
+class GestureRecognizer:
+    # distance(a, b) is compared against ratio * (thumb length)
+    SCALE_PAIRS = ((Hand.THUMB_MCP, Hand.THUMB_IP), (Hand.THUMB_IP, Hand.THUMB_TIP))
+
+    RULES = (
+        GestureRule(
+            'reload',
+            (
+                (Hand.THUMB_TIP, Hand.RING_FINGER_PIP, '<', 1),
+                (Hand.INDEX_FINGER_TIP, Hand.MIDDLE_FINGER_TIP, '<', 1),
+            ),
+        ),
+    )
+
+    # compiled tables per rule set, shared by the recognizers of all tracks
+    compiled: dict[tuple[GestureRule, ...], tuple[list, list]] = {}
+
+    def __init__(self, rules: tuple[GestureRule, ...] = RULES) -> None:
+        self.rules = rules
+        if rules not in GestureRecognizer.compiled:
+            GestureRecognizer.compiled[rules] = self.compile(rules)
+        self.pairs, self.compiled_rules = GestureRecognizer.compiled[rules]
+        self.scale_indices = range(len(self.SCALE_PAIRS))
+        self.start_time: dict[str, float] = {}
+        self.fire_time: dict[str, float] = {}
+        self.active: set[str] = set()
+        self.fired: set[str] = set()
+
+    @classmethod
+    def compile(cls, rules: tuple[GestureRule, ...]) -> tuple[list, list]:
+        pairs: list[tuple[int, int]] = list(cls.SCALE_PAIRS)
+        compiled_rules = []
+        for rule in rules:
+            conditions = []
+            for a, b, op, ratio in rule.conditions:
+                pair = (min(a, b), max(a, b))
+                if pair not in pairs:
+                    pairs.append(pair)
+                conditions.append((pairs.index(pair), op == '<', ratio))
+            compiled_rules.append((rule, conditions))
+        return pairs, compiled_rules
+
+    def detect(self, hand: Hand, distances: list[float] | None = None) -> None:
+        if distances is None:
+            distances = hand.pair_distances(self.pairs)
+        scale = sum(distances[i] for i in self.scale_indices)
+        self.fired = set()
+        for rule, conditions in self.compiled_rules:
+            matched = all(
+                (distances[i] < ratio * scale) == less
+                for i, less, ratio in conditions
+            )
+            if not matched:
+                self.start_time.pop(rule.name, None)
+                self.active.discard(rule.name)
+                continue
+            start_time = self.start_time.setdefault(rule.name, hand.time)
+            if hand.time - start_time < rule.hold_time:
+                continue
+            if rule.name not in self.active:
+                if hand.time - self.fire_time.get(rule.name, -math.inf) < rule.cooldown:
+                    continue
+                self.active.add(rule.name)
+                self.fired.add(rule.name)
+                self.fire_time[rule.name] = hand.time
+
+    def is_active(self, name: str) -> bool:
+        return name in self.active
+
+    def save_state(self, writer: StateWriter) -> None:
+        for rule, _ in self.compiled_rules:
+            writer.pack(
+                'dd??',
+                self.start_time.get(rule.name, math.nan),
+                self.fire_time.get(rule.name, math.nan),
+                rule.name in self.active,
+                rule.name in self.fired,
+            )
+
+    def load_state(self, reader: StateReader) -> None:
+        self.start_time = {}
+        self.fire_time = {}
+        self.active = set()
+        self.fired = set()
+        for rule, _ in self.compiled_rules:
+            start_time, fire_time, active, fired = reader.unpack('dd??')
+            if not math.isnan(start_time):
+                self.start_time[rule.name] = start_time
+            if not math.isnan(fire_time):
+                self.fire_time[rule.name] = fire_time
+            if active:
+                self.active.add(rule.name)
+            if fired:
+                self.fired.add(rule.name)
+
+    def is_fired(self, name: str) -> bool:
+        return name in self.fired
 
 
 class ReloadDetector:
+    GESTURE = 'reload'
+
     def __init__(self) -> None:
         self.reload_flag = False
 
-    def detect(self, hand: Hand) -> None:
-        if (
-            distance(hand.thumb_tip_point(), hand.ring_finger_pip_point())
-            < hand.thumb_length()
-            and distance(hand.index_finger_tip_point(), hand.middle_finger_tip_point())
-            < hand.thumb_length()
-        ):
-            self.reload_flag = True
-        else:
-            self.reload_flag = False
+    def detect(self, gesture_recognizer: GestureRecognizer) -> None:
+        self.reload_flag = gesture_recognizer.is_active(self.GESTURE)
 
     def is_reload(self) -> None:
         return self.reload_flag
@@ -222,6 +1191,14 @@ class PointDetector:
             self.pointing_count = 0
             self.pointing_position = []
 
+    def save_state(self, writer: StateWriter) -> None:
+        writer.pack('Hd', self.pointing_count, self.pointing_time)
+        writer.pack_vector(self.pointing_position)
+
+    def load_state(self, reader: StateReader) -> None:
+        self.pointing_count, self.pointing_time = reader.unpack('Hd')
+        self.pointing_position = [int(v) for v in reader.unpack_vector()]
+
     def selected_point(self) -> list[int]:
         if self.pointing_count < self.POINT_INTERVAL:
             return []
@@ -231,9 +1208,9 @@ class PointDetector:
 
     def draw(self) -> None:
         if self.pointing_position and self.pointing_time > self.DETECTION_DRAW_START_TIME:
-            pyxel.circb(self.pointing_position[0], self.pointing_position[1], self.RADIUS, 8)
+            renderer.circb(self.pointing_position[0], self.pointing_position[1], self.RADIUS, 8)
             r = int(min(self.pointing_time / self.DETECTION_TIME, 1) * self.RADIUS)
-            pyxel.circ(self.pointing_position[0], self.pointing_position[1], r, 8)
+            renderer.circ(self.pointing_position[0], self.pointing_position[1], r, 8)
 
 
 class VideoMarkImage:
@@ -256,89 +1233,445 @@ class VideoMarkImage:
     def draw(self, color :int) -> None:
         x = self.MARGIN
         y = WINDOW_H - self.MARGIN - self.H
-        pyxel.pal(self.VIDEO_COLOR, color)
-        pyxel.blt(x, y, self.I, self.U, self.V, self.W, self.H, self.COLKEY)
-        pyxel.pal(self.VIDEO_COLOR, self.VIDEO_COLOR)
+        renderer.pal(self.VIDEO_COLOR, color)
+        renderer.blt(x, y, self.I, self.U, self.V, self.W, self.H, self.COLKEY)
+        renderer.pal(self.VIDEO_COLOR, self.VIDEO_COLOR)
 
 
-class MediapipeManager:
-    STORE_HAND_TIME = 2
+class HandTrack:
+    SHOOT_DETECTORS = {
+        'legacy': ShootDetector,
+        'velocity': VelocityShootDetector,
+    }
+    # the velocity detector is opt-in, see MediapipeManager.SHOOT_MODE
+    SHOOT_MODE = 'legacy'
 
-    def __init__(self, sens: float) -> None:
-        self.video_mark_image = VideoMarkImage()
-        self.sens = sens
-        self.connect_flag = False
-        self.detect_flag = False
-        self.update_flag = False
-        self.videoAspect = 1
+    MAX_GAP_FILL_TIME = 0.2
+    EXTRAPOLATION_DAMPING = 0.5
+
+    def __init__(self, track_id: int, shoot_mode: str = SHOOT_MODE) -> None:
+        self.track_id = track_id
+        self.shoot_mode = shoot_mode
+        self.label = ''
+        self.reset()
+
+    def reset(self) -> None:
         self.hand_history: list[Hand] = []
-        self.before_video_time = -1
-        self.processing_time = 0
-        self.shoot_detector = ShootDetector()
+        self.real_hands: deque[Hand] = deque(maxlen=2)
+        self.detect_flag = False
+        self.shoot_detector = self.SHOOT_DETECTORS[self.shoot_mode](self.label)
+        self.gesture_recognizer = GestureRecognizer()
         self.reload_detector = ReloadDetector()
         self.point_detector = PointDetector()
 
-    def connect(self) -> None:
-        enable_webcam_flag = js.webcamRunning
-        enable_detection_flag = js.detectionRunning
-        if enable_webcam_flag and enable_detection_flag:
-            videoWidth = js.videoWidth
-            videoHeight = js.videoHeight
-            self.videoAspect = videoWidth / videoHeight
-            self.connect_flag = True
-
     def update(self) -> None:
-        videoWidth = js.videoWidth
-        videoHeight = js.videoHeight
-        self.videoAspect = videoWidth / videoHeight
-
-        self.get_landmarks()
-
         self.shoot_detector.update()
         self.point_detector.update()
 
-        if self.update_flag and self.hand_history:
-            self.shoot_detector.detect(self.hand_history)
-            self.reload_detector.detect(self.hand_history[-1])
-            self.point_detector.detect(self.hand_history)
+    def add_hand(self, hand: Hand | None, video_time: float, sens: float) -> None:
+        if hand is not None:
+            self.detect_flag = True
+            self.interpolate_gap(hand, sens)
+            self.hand_history.append(hand)
+            self.real_hands.append(hand)
+            return
+        self.detect_flag = False
+        if not self.real_hands:
+            return
+        if video_time - self.real_hands[-1].time > self.MAX_GAP_FILL_TIME:
+            if self.hand_history:
+                self.reset()
+            return
+        self.hand_history.append(self.extrapolate(video_time, sens))
+
+    def extrapolate(self, video_time: float, sens: float) -> Hand:
+        last = self.real_hands[-1]
+        if len(self.real_hands) < 2:
+            points = [point[:] for point in last.points]
+        else:
+            previous = self.real_hands[0]
+            scale = (
+                (video_time - last.time)
+                / (last.time - previous.time)
+                * self.EXTRAPOLATION_DAMPING
+            )
+            points = [
+                [p + (p - q) * scale for p, q in zip(point, previous_point)]
+                for point, previous_point in zip(last.points, previous.points)
+            ]
+        return Hand.from_points(points, sens, video_time, True)
+
+    def interpolate_gap(self, hand: Hand, sens: float) -> None:
+        # replace the extrapolated tail now that both ends of the gap are known
+        if not self.hand_history or not self.hand_history[-1].synthetic:
+            return
+        last = self.real_hands[-1]
+        span = hand.time - last.time
+        for i in range(len(self.hand_history) - 1, -1, -1):
+            synthetic = self.hand_history[i]
+            if not synthetic.synthetic:
+                break
+            t = (synthetic.time - last.time) / span
+            points = [
+                [p + (q - p) * t for p, q in zip(point, next_point)]
+                for point, next_point in zip(last.points, hand.points)
+            ]
+            self.hand_history[i] = Hand.from_points(points, sens, synthetic.time, True)
+
+    def prune(self, video_time: float, store_time: float) -> None:
+        self.hand_history = [
+            hand for hand in self.hand_history if video_time - hand.time < store_time
+        ]
 
     def latest_hand(self) -> Hand | None:
         if self.hand_history:
             return self.hand_history[-1]
         return None
 
-    def get_landmarks(self) -> None:
-        results = js.getResults().to_py()
+    def is_tracking(self) -> bool:
+        return bool(self.hand_history)
+
+    def is_stable(self, stable_time: float, aim_stable: bool = True) -> bool:
+        hand = self.latest_hand()
+        if hand is None:
+            return False
+        shoot_detector = self.shoot_detector
+        if shoot_detector.mark is not None and shoot_detector.mark_time == hand.time:
+            # the velocity detectors need every result while the shot is aimed
+            return aim_stable
+        return self.point_detector.pointing_time >= stable_time
+
+    def match_distance(self, hand: Hand) -> float:
+        return distance(self.hand_history[-1].points[0][:2], hand.points[0][:2])
+
+    def set_label(self, label: str) -> None:
+        self.label = label
+        self.shoot_detector.label = label
+
+    def save_state(self, writer: StateWriter) -> None:
+        writer.pack_text(self.shoot_mode)
+        writer.pack_text(self.label)
+        writer.pack('?H', self.detect_flag, len(self.hand_history))
+        for hand in self.hand_history:
+            hand.save_state(writer)
+        writer.pack('B', len(self.real_hands))
+        for hand in self.real_hands:
+            hand.save_state(writer)
+        self.shoot_detector.save_state(writer)
+        self.gesture_recognizer.save_state(writer)
+        writer.pack('?', self.reload_detector.reload_flag)
+        self.point_detector.save_state(writer)
+
+    def load_state(self, reader: StateReader) -> None:
+        self.shoot_mode = reader.unpack_text()
+        self.label = reader.unpack_text()
+        self.reset()
+        self.detect_flag, hand_num = reader.unpack('?H')
+        self.hand_history = [Hand.from_state(reader) for _ in range(hand_num)]
+        (hand_num,) = reader.unpack('B')
+        self.real_hands.extend(Hand.from_state(reader) for _ in range(hand_num))
+        self.shoot_detector.load_state(reader)
+        self.gesture_recognizer.load_state(reader)
+        (self.reload_detector.reload_flag,) = reader.unpack('?')
+        self.point_detector.load_state(reader)
+
+
+class MediapipeManager:
+    STORE_HAND_TIME = 2
+    MATCH_DISTANCE = 0.3
+    MAX_HAND_NUM = 4
+    RESULT_QUEUE_SIZE = 8
+    LATENCY_SMOOTHING = 0.1
+    MAX_REWIND_TIME = 0.6
+    SHOOT_MODE = HandTrack.SHOOT_MODE
+
+    # region of interest around the detected hands, in video-normalized coordinates
+    ROI_MARGIN = 0.75
+    ROI_MIN_SIZE = 0.3
+    ROI_UPDATE_THRESHOLD = 0.03
+    # detection input is downscaled while results come in slower than this
+    TARGET_PROCESSING_TIME = 1 / 15
+    MIN_INPUT_SCALE = 0.4
+    INPUT_SCALE_STEP = 0.05
+    # detections per second requested from the page, the camera runs at about 30
+    FULL_DETECTION_RATE = 30
+    STABLE_TIME = 1
+
+    def __init__(self, sens: float, hand_num: int = 1, shoot_mode: str | None = None) -> None:
+        self.video_mark_image = None
+        self.sens = sens
+        self.shoot_mode = shoot_mode or self.SHOOT_MODE
+        self.connect_flag = False
+        self.update_flag = False
+        self.video_width = 0
+        self.video_height = 0
+        self.videoAspect = 1
+        self.result_queue: deque[dict] = deque(maxlen=self.RESULT_QUEUE_SIZE)
+        self.before_video_time = -1
+        self.processing_time = 0
+        self.processing_time_text = '0.000'
+        self.input_scale = 1.0
+        self.region: list[float] | None = None
+        self.detection_rate = self.FULL_DETECTION_RATE
+        self.exporter: LandmarkExporter | None = None
+        self.latency = 0.5 / FPS
+        self.tracks: list[HandTrack] = []
+        self.set_hand_num(hand_num)
+
+    def set_hand_num(self, hand_num: int) -> None:
+        hand_num = max(1, min(hand_num, self.MAX_HAND_NUM))
+        if hand_num == len(self.tracks):
+            return
+        self.tracks = self.tracks[:hand_num]
+        for track_id in range(len(self.tracks), hand_num):
+            self.tracks.append(HandTrack(track_id, self.shoot_mode))
+        for track in self.tracks:
+            track.set_label('P{}'.format(track.track_id + 1) if hand_num > 1 else '')
+        if js is not None:
+            js.numHands = hand_num
+
+    def hand_num(self) -> int:
+        return len(self.tracks)
+
+    def save_state(self, writer: StateWriter) -> None:
+        writer.pack(
+            '4dB',
+            self.sens,
+            self.before_video_time,
+            self.latency,
+            self.processing_time,
+            len(self.tracks),
+        )
+        for track in self.tracks:
+            track.save_state(writer)
+
+    def load_state(self, reader: StateReader) -> None:
+        (
+            self.sens,
+            self.before_video_time,
+            self.latency,
+            self.processing_time,
+            hand_num,
+        ) = reader.unpack('4dB')
+        self.set_hand_num(hand_num)
+        for track in self.tracks:
+            track.load_state(reader)
+
+    @property
+    def hand_history(self) -> list[Hand]:
+        return self.tracks[0].hand_history
+
+    @property
+    def shoot_detector(self) -> ShootDetector:
+        return self.tracks[0].shoot_detector
+
+    @property
+    def reload_detector(self) -> ReloadDetector:
+        return self.tracks[0].reload_detector
+
+    @property
+    def point_detector(self) -> PointDetector:
+        return self.tracks[0].point_detector
+
+    def on_connect(self, video_width: int, video_height: int) -> None:
+        self.set_video_size(video_width, video_height)
+        self.connect_flag = True
+
+    def on_results(self, results: dict) -> None:
+        self.result_queue.append(results)
+
+    def set_video_size(self, video_width: int, video_height: int) -> None:
+        self.video_width = video_width
+        self.video_height = video_height
+        self.videoAspect = video_width / video_height
+
+    def update(self) -> None:
+        for track in self.tracks:
+            track.update()
+
+        self.update_flag = False
+        while self.result_queue:
+            video_time = self.before_video_time
+            self.get_landmarks(self.result_queue.popleft())
+            if self.update_flag:
+                self.detect()
+            if self.exporter is not None and self.before_video_time != video_time:
+                self.exporter.publish(self.before_video_time, self.tracks)
+
+    def detect(self) -> None:
+        # each detector stage runs over all tracks at once; the gesture pair
+        # distances of every hand come from one batched computation
+        tracks = [track for track in self.tracks if track.hand_history]
+        if not tracks:
+            return
+        for track in tracks:
+            track.shoot_detector.detect(track.hand_history)
+        pairs = tracks[0].gesture_recognizer.pairs
+        if all(track.gesture_recognizer.pairs is pairs for track in tracks):
+            distances = Hand.batch_pair_distances(
+                [track.hand_history[-1] for track in tracks], pairs
+            )
+        else:
+            distances = [None] * len(tracks)
+        for track, hand_distances in zip(tracks, distances):
+            track.gesture_recognizer.detect(track.hand_history[-1], hand_distances)
+            track.reload_detector.detect(track.gesture_recognizer)
+        for track in tracks:
+            track.point_detector.detect(track.hand_history)
+
+    def latest_hand(self) -> Hand | None:
+        return self.tracks[0].latest_hand()
+
+    def get_landmarks(self, results: dict) -> None:
         video_time = results['videoTime']
         landmarks = results['landmarks']
         if self.before_video_time == video_time:
-            self.update_flag = False
             return
+        self.set_video_size(results['videoWidth'], results['videoHeight'])
+        self.update_latency(results.get('inferenceTime', 0) / 1000)
         if self.before_video_time > 0:
             self.processing_time = video_time - self.before_video_time
+            self.processing_time_text = '{:.3f}'.format(self.processing_time)
         self.update_flag = True
         self.before_video_time = video_time
-        if len(landmarks) == 0:
-            self.detect_flag = False
-        else:
-            self.detect_flag = True
-            self.hand_history.append(Hand(landmarks[0], self.videoAspect, self.sens, video_time))
-        self.hand_history = [
-            hand
-            for hand in self.hand_history
-            if video_time - hand.time < self.STORE_HAND_TIME
+        hands = [
+            Hand(hand_landmarks, self.videoAspect, self.sens, video_time)
+            for hand_landmarks in landmarks[: len(self.tracks)]
+        ]
+        self.assign_hands(hands, video_time)
+        self.update_region(landmarks[: len(self.tracks)], results.get('region'))
+        self.update_input_scale()
+        for track in self.tracks:
+            track.prune(video_time, self.STORE_HAND_TIME)
+
+    def calc_region(self, landmarks: list) -> list[float] | None:
+        # every player has to be inside, otherwise the full frame is searched
+        if not landmarks or len(landmarks) < len(self.tracks):
+            return None
+        xs = [point['x'] * self.video_width for hand in landmarks for point in hand]
+        ys = [point['y'] * self.video_height for hand in landmarks for point in hand]
+        size = max(max(xs) - min(xs), max(ys) - min(ys)) * (1 + 2 * self.ROI_MARGIN)
+        half = max(size, self.ROI_MIN_SIZE * self.video_height) / 2
+        cx = min(max((max(xs) + min(xs)) / 2, 0), self.video_width)
+        cy = min(max((max(ys) + min(ys)) / 2, 0), self.video_height)
+        return [
+            max(0, (cx - half) / self.video_width),
+            max(0, (cy - half) / self.video_height),
+            min(1, (cx + half) / self.video_width),
+            min(1, (cy + half) / self.video_height),
         ]
 
+    def update_region(self, landmarks: list, current_region: list[float] | None) -> None:
+        self.region = self.calc_region(landmarks)
+        if js is None:
+            return
+        if self.region is None:
+            if current_region is not None:
+                js.clearRegionOfInterest()
+            return
+        if current_region is None or any(
+            abs(a - b) > self.ROI_UPDATE_THRESHOLD
+            for a, b in zip(self.region, current_region)
+        ):
+            js.setRegionOfInterest(*self.region)
+
+    def update_input_scale(self) -> None:
+        input_scale = self.input_scale
+        detection_interval = self.detection_interval()
+        if detection_interval > self.TARGET_PROCESSING_TIME * 1.2:
+            input_scale = max(self.MIN_INPUT_SCALE, input_scale - self.INPUT_SCALE_STEP)
+        elif 0 < detection_interval < self.TARGET_PROCESSING_TIME * 0.8:
+            input_scale = min(1.0, input_scale + self.INPUT_SCALE_STEP)
+        input_scale = round(input_scale, 2)
+        if input_scale != self.input_scale:
+            self.input_scale = input_scale
+            if js is not None:
+                js.inputScale = input_scale
+
+    def detection_interval(self) -> float:
+        # processing time as if detection ran at full rate
+        return self.processing_time * min(1, self.detection_rate / self.FULL_DETECTION_RATE)
+
+    def set_detection_rate(self, detection_rate: float) -> None:
+        if detection_rate == self.detection_rate:
+            return
+        self.detection_rate = detection_rate
+        if js is not None:
+            js.detectionRate = detection_rate
+
+    def is_stable(self, aim_stable: bool = True) -> bool:
+        tracks = [track for track in self.tracks if track.detect_flag]
+        return bool(tracks) and all(
+            track.is_stable(self.STABLE_TIME, aim_stable) for track in tracks
+        )
+
+    def update_detection_rate(
+        self, detection_rate: float, stable_rate: float, aim_stable: bool = True
+    ) -> None:
+        # aim_stable=False keeps the full rate while a shot is aimed, e.g. in play
+        stable = self.is_stable(aim_stable)
+        self.set_detection_rate(stable_rate if stable else detection_rate)
+
+    def update_latency(self, inference_time: float) -> None:
+        # a result waits half a game frame on average before it is processed
+        latency = inference_time + 0.5 / FPS
+        self.latency += (latency - self.latency) * self.LATENCY_SMOOTHING
+
+    def rewind_frames(self, shoot_detector: ShootDetector) -> int:
+        rewind_time = shoot_detector.shoot_position_age() + self.latency
+        return round(min(rewind_time, self.MAX_REWIND_TIME) * FPS)
+
+    def assign_hands(self, hands: list[Hand], video_time: float) -> None:
+        assigned: dict[int, Hand] = {}
+        used_hands = set()
+        pairs = sorted(
+            (track.match_distance(hand), track_id, hand_id)
+            for track_id, track in enumerate(self.tracks)
+            if track.is_tracking()
+            for hand_id, hand in enumerate(hands)
+        )
+        for d, track_id, hand_id in pairs:
+            if d > self.MATCH_DISTANCE:
+                break
+            if track_id in assigned or hand_id in used_hands:
+                continue
+            assigned[track_id] = hands[hand_id]
+            used_hands.add(hand_id)
+        free_tracks = sorted(
+            (track_id for track_id in range(len(self.tracks)) if track_id not in assigned),
+            key=lambda track_id: self.tracks[track_id].is_tracking(),
+        )
+        new_hands = [hand for hand_id, hand in enumerate(hands) if hand_id not in used_hands]
+        for track_id, hand in zip(free_tracks, new_hands):
+            assigned[track_id] = hand
+        for track_id, track in enumerate(self.tracks):
+            track.add_hand(assigned.get(track_id), video_time, self.sens)
+
+    def selected_point(self) -> list[int]:
+        for track in self.tracks:
+            point = track.point_detector.selected_point()
+            if point:
+                return point
+        return []
+
+    def is_pointing(self) -> bool:
+        return any(track.point_detector.pointing_position for track in self.tracks)
+
     def is_detect(self) -> bool:
-        return self.detect_flag
+        return any(track.detect_flag for track in self.tracks)
 
     def is_video_connect(self) -> bool:
         return self.connect_flag
 
+    def load(self) -> None:
+        if self.video_mark_image is None:
+            self.video_mark_image = VideoMarkImage()
+
     def draw(self) -> None:
-        if self.hand_history:
-            hand = self.hand_history[-1]
-            if self.before_video_time == hand.time:
+        self.load()
+        for track in self.tracks:
+            hand = track.latest_hand()
+            if hand is not None and self.before_video_time == hand.time:
                 hand.draw()
         if self.processing_time < 0.1:
             self.video_mark_image.draw(11)
@@ -346,9 +1679,215 @@ class MediapipeManager:
             self.video_mark_image.draw(10)
         else:
             self.video_mark_image.draw(8)
-        x = self.video_mark_image.MARGIN + 10
-        y = WINDOW_H - self.video_mark_image.MARGIN - self.video_mark_image.H // 2
-        pyxel.text(x, y, '{:.3f}'.format(self.processing_time), 7)
+        x = VideoMarkImage.MARGIN + 10
+        y = WINDOW_H - VideoMarkImage.MARGIN - VideoMarkImage.H // 2
+        renderer.text(x, y, self.processing_time_text, 7)
+
+    def draw_pointer(self) -> None:
+        for track in self.tracks:
+            track.point_detector.draw()
+
+    def draw_mark(self) -> None:
+        for track in self.tracks:
+            track.shoot_detector.draw()
+
+
+class LandmarkExporter:
+    # ring of fixed-size slots in shared memory, one per ingested result; a slot
+    # holds its sequence number only while it is complete, see landmark_reader.py
+    MAGIC = b'OBKH'
+    VERSION = 1
+    HEADER = struct.Struct('<4sHHIBxxxQ')
+    SEQUENCE_OFFSET = HEADER.size - 8
+    SLOT_HEADER = struct.Struct('<Qd')
+    POINT_NUM = 21
+    TRACK = struct.Struct('<B2f2f2f2hf{}f'.format(POINT_NUM * 3))
+    SLOT_COUNT = 256
+
+    PRESENT = 1
+    SYNTHETIC = 2
+    MARK = 4
+    SHOOT = 8
+    RELOAD = 16
+    POINT = 32
+    SELECTED = 64
+
+    def __init__(
+        self,
+        name: str,
+        slot_count: int = SLOT_COUNT,
+        track_count: int = MediapipeManager.MAX_HAND_NUM,
+    ) -> None:
+        from multiprocessing import shared_memory
+
+        self.slot_count = slot_count
+        self.track_count = track_count
+        self.slot_size = self.SLOT_HEADER.size + self.TRACK.size * track_count
+        size = self.HEADER.size + self.slot_size * slot_count
+        try:
+            self.shm = shared_memory.SharedMemory(name, create=True, size=size)
+        except FileExistsError:
+            # left behind by a run that did not exit cleanly
+            shared_memory.SharedMemory(name).unlink()
+            self.shm = shared_memory.SharedMemory(name, create=True, size=size)
+        self.HEADER.pack_into(
+            self.shm.buf, 0, self.MAGIC, self.VERSION, slot_count, self.slot_size, track_count, 0
+        )
+        self.sequence = 0
+        self.shots: list[Any] = [None] * track_count
+        atexit.register(self.close)
+
+    def publish(self, video_time: float, tracks: list[HandTrack]) -> None:
+        buf = self.shm.buf
+        sequence = self.sequence + 1
+        offset = self.HEADER.size + sequence % self.slot_count * self.slot_size
+        self.SLOT_HEADER.pack_into(buf, offset, 0, video_time)
+        track_offset = offset + self.SLOT_HEADER.size
+        for i in range(self.track_count):
+            track = tracks[i] if i < len(tracks) else None
+            self.pack_track(buf, track_offset, i, track, video_time)
+            track_offset += self.TRACK.size
+        self.SLOT_HEADER.pack_into(buf, offset, sequence, video_time)
+        struct.pack_into('<Q', buf, self.SEQUENCE_OFFSET, sequence)
+        self.sequence = sequence
+
+    def pack_track(
+        self, buf: Any, offset: int, i: int, track: HandTrack | None, video_time: float
+    ) -> None:
+        hand = track.latest_hand() if track is not None else None
+        if hand is None or hand.time != video_time:
+            buf[offset] = 0
+            return
+        shoot_detector = track.shoot_detector
+        point_detector = track.point_detector
+        flags = self.PRESENT
+        if hand.synthetic:
+            flags |= self.SYNTHETIC
+        if shoot_detector.mark is not None:
+            flags |= self.MARK
+        # a shot stays flagged until the next frame, export it with the result that fired it
+        if shoot_detector.is_shoot() and shoot_detector.position is not self.shots[i]:
+            flags |= self.SHOOT
+            self.shots[i] = shoot_detector.position
+        if track.reload_detector.is_reload():
+            flags |= self.RELOAD
+        if point_detector.pointing_position:
+            flags |= self.POINT
+        if point_detector.selected_point():
+            flags |= self.SELECTED
+        self.TRACK.pack_into(
+            buf,
+            offset,
+            flags,
+            *hand.target,
+            *(shoot_detector.mark or (0, 0)),
+            *(shoot_detector.position or (0, 0)),
+            *(point_detector.pointing_position or (0, 0)),
+            point_detector.pointing_time,
+            *(v for point in hand.points for v in point),
+        )
+
+    def close(self) -> None:
+        if self.shm is None:
+            return
+        self.shm.close()
+        self.shm.unlink()
+        self.shm = None
+
+
+class SpriteCache:
+    SLOT_W = 32
+    SLOT_H = 32
+    # (image bank, x0, y0, x1, y1) areas not used by any asset
+    FREE_AREAS = (
+        (1, 64, 0, 256, 32),
+        (1, 176, 57, 256, 249),
+        (1, 64, 120, 160, 248),
+        (1, 0, 168, 64, 232),
+        (2, 216, 0, 256, 96),
+        (2, 176, 164, 240, 228),
+        (2, 0, 223, 96, 255),
+    )
+    FADE_LEVELS = 4
+
+    variants: 'OrderedDict[tuple, tuple[int, int, int]]' = OrderedDict()
+    free_slots: list[tuple[int, int, int]] | None = None
+    scratch = None
+
+    @classmethod
+    def slots(cls) -> list[tuple[int, int, int]]:
+        return [
+            (i, u, v)
+            for i, x0, y0, x1, y1 in cls.FREE_AREAS
+            for v in range(y0, y1 - cls.SLOT_H + 1, cls.SLOT_H)
+            for u in range(x0, x1 - cls.SLOT_W + 1, cls.SLOT_W)
+        ]
+
+    @classmethod
+    def fade_level(cls, alpha: float) -> int:
+        return max(0, min(cls.FADE_LEVELS, math.ceil(alpha * cls.FADE_LEVELS)))
+
+    @classmethod
+    def draw(
+        cls,
+        image: Any,
+        x: float,
+        y: float,
+        flip: bool = False,
+        color_map: tuple[tuple[int, int], ...] = (),
+        alpha: float = 1,
+    ):
+        level = cls.fade_level(alpha)
+        if level == 0:
+            return
+        if not flip and not color_map and level == cls.FADE_LEVELS:
+            renderer.blt(x, y, image.I, image.U, image.V, image.W, image.H, image.COLKEY)
+            return
+        if any(col == image.COLKEY for _, col in color_map):
+            cls.draw_direct(image, x, y, flip, color_map, level / cls.FADE_LEVELS)
+            return
+        key = (image.I, image.U, image.V, flip, color_map, level)
+        slot = cls.variants.get(key)
+        if slot is None:
+            slot = cls.bake(image, key)
+        else:
+            cls.variants.move_to_end(key)
+        i, u, v = slot
+        renderer.blt(x, y, i, u, v, image.W, image.H, image.COLKEY)
+
+    @classmethod
+    def draw_direct(cls, image, x, y, flip, color_map, alpha):
+        for col1, col2 in color_map:
+            renderer.pal(col1, col2)
+        renderer.dither(alpha)
+        w = -image.W if flip else image.W
+        renderer.blt(x, y, image.I, image.U, image.V, w, image.H, image.COLKEY)
+        renderer.dither(1)
+        renderer.pal()
+
+    @classmethod
+    def bake(cls, image: Any, key: tuple) -> tuple[int, int, int]:
+        if cls.free_slots is None:
+            cls.free_slots = cls.slots()
+            cls.scratch = pyxel.Image(cls.SLOT_W, cls.SLOT_H)
+        if cls.free_slots:
+            slot = cls.free_slots.pop(0)
+        else:
+            _, slot = cls.variants.popitem(last=False)
+        _, _, _, flip, color_map, level = key
+        i, u, v = slot
+        cls.scratch.blt(0, 0, image.I, image.U, image.V, image.W, image.H)
+        bank = pyxel.images[i]
+        bank.rect(u, v, cls.SLOT_W, cls.SLOT_H, image.COLKEY)
+        for col1, col2 in color_map:
+            bank.pal(col1, col2)
+        bank.dither(level / cls.FADE_LEVELS)
+        w = -image.W if flip else image.W
+        bank.blt(u, v, cls.scratch, 0, 0, w, image.H, image.COLKEY)
+        bank.dither(1)
+        bank.pal()
+        cls.variants[key] = slot
+        return slot
 
 
 class ObakeDeadImage:
@@ -366,16 +1905,18 @@ class ObakeDeadImage:
     def load(self) -> None:
         pyxel.images[self.I].load(self.U, self.V, self.ASSET_FILE)
 
-    def draw(self, x: int, y: int, flip: bool) -> None:
-        if flip:
-            pyxel.blt(x, y, self.I, self.U, self.V, -self.W, self.H, self.COLKEY)
-        else:
-            pyxel.blt(x, y, self.I, self.U, self.V, self.W, self.H, self.COLKEY)
+    def draw(
+        self,
+        x: int,
+        y: int,
+        flip: bool,
+        color_map: tuple[tuple[int, int], ...] = (),
+        alpha: float = 1,
+    ) -> None:
+        SpriteCache.draw(self, x, y, flip, color_map, alpha)
 
 
 class ObakeDeadParticle:
-    obake_dead_particle_list = []
-    obake_dead_image = None
     ACTIVE_TIME = 30
     OFFSET = 0.1
 
@@ -391,40 +1932,61 @@ class ObakeDeadParticle:
         if self.count >= self.ACTIVE_TIME:
             self.active = False
 
-    def _draw(self) -> None:
+    def _draw(self, obake_dead_image: ObakeDeadImage, fade: bool = True) -> None:
+        if not fade:
+            obake_dead_image.draw(self.x, self.y, self.flip)
+            return
         dither = max(
             0, min(1, (self.ACTIVE_TIME - self.count) / self.ACTIVE_TIME + self.OFFSET)
         )
-        pyxel.dither(dither)
-        self.obake_dead_image.draw(self.x, self.y, self.flip)
-        pyxel.dither(1)
+        obake_dead_image.draw(self.x, self.y, self.flip, alpha=dither)
 
-    @classmethod
-    def add_particle(cls, x: int, y: int, flip: bool):
-        if cls.obake_dead_image is not None:
-            cls.obake_dead_particle_list.append(ObakeDeadParticle(x, y, flip))
+
+class ObakeDeadParticleManager:
+    obake_dead_image = None
+
+    def __init__(self) -> None:
+        self.obake_dead_particle_list: list[ObakeDeadParticle] = []
+
+    def add_particle(self, x: int, y: int, flip: bool) -> None:
+        self.obake_dead_particle_list.append(ObakeDeadParticle(x, y, flip))
 
     @classmethod
     def load(cls):
         if cls.obake_dead_image is None:
             cls.obake_dead_image = ObakeDeadImage()
 
-    @classmethod
-    def reset(cls):
-        cls.obake_dead_particle_list = []
+    def reset(self) -> None:
+        self.obake_dead_particle_list = []
 
-    @classmethod
-    def update(cls):
-        for particle in cls.obake_dead_particle_list:
+    def save_state(self, writer: StateWriter) -> None:
+        writer.pack('H', len(self.obake_dead_particle_list))
+        for particle in self.obake_dead_particle_list:
+            writer.pack(
+                'dd?H?', particle.x, particle.y, particle.flip, particle.count, particle.active
+            )
+
+    def load_state(self, reader: StateReader) -> None:
+        (particle_num,) = reader.unpack('H')
+        self.obake_dead_particle_list = []
+        for _ in range(particle_num):
+            x, y, flip, count, active = reader.unpack('dd?H?')
+            particle = ObakeDeadParticle(x, y, flip)
+            particle.count = count
+            particle.active = active
+            self.obake_dead_particle_list.append(particle)
+
+    def update(self) -> None:
+        for particle in self.obake_dead_particle_list:
             particle._update()
-        cls.obake_dead_particle_list = [
-            particle for particle in cls.obake_dead_particle_list if particle.active
+        self.obake_dead_particle_list = [
+            particle for particle in self.obake_dead_particle_list if particle.active
         ]
 
-    @classmethod
-    def draw(cls):
-        for particle in cls.obake_dead_particle_list:
-            particle._draw()
+    def draw(self, fade: bool = True) -> None:
+        self.load()
+        for particle in self.obake_dead_particle_list:
+            particle._draw(self.obake_dead_image, fade)
 
 
 class ObakeImage:
@@ -442,11 +2004,99 @@ class ObakeImage:
     def load(self) -> None:
         pyxel.images[self.I].load(self.U, self.V, self.ASSET_FILE)
 
-    def draw(self, x: int, y: int, flip: bool) -> None:
-        if flip:
-            pyxel.blt(x, y, self.I, self.U, self.V, -self.W, self.H, self.COLKEY)
-        else:
-            pyxel.blt(x, y, self.I, self.U, self.V, self.W, self.H, self.COLKEY)
+    def draw(
+        self,
+        x: int,
+        y: int,
+        flip: bool,
+        color_map: tuple[tuple[int, int], ...] = (),
+        alpha: float = 1,
+    ) -> None:
+        SpriteCache.draw(self, x, y, flip, color_map, alpha)
+
+
+class PositionHistory:
+    SIZE = 32
+
+    def __init__(self) -> None:
+        self.xs = array('f', bytes(4 * self.SIZE))
+        self.ys = array('f', bytes(4 * self.SIZE))
+        self.flips = bytearray(self.SIZE)
+        self.count = 0
+
+    def push(self, x: float, y: float, flip: bool) -> None:
+        i = self.count % self.SIZE
+        self.xs[i] = x
+        self.ys[i] = y
+        self.flips[i] = flip
+        self.count += 1
+
+    def position(self, frames_ago: int) -> tuple[float, float, bool]:
+        frames_ago = max(0, min(frames_ago, self.count - 1, self.SIZE - 1))
+        i = (self.count - 1 - frames_ago) % self.SIZE
+        return self.xs[i], self.ys[i], bool(self.flips[i])
+
+    def save_state(self, writer: StateWriter) -> None:
+        writer.pack('I', self.count)
+        writer.write(self.xs.tobytes())
+        writer.write(self.ys.tobytes())
+        writer.write(bytes(self.flips))
+
+    def load_state(self, reader: StateReader) -> None:
+        (self.count,) = reader.unpack('I')
+        self.xs = array('f', reader.read(4 * self.SIZE))
+        self.ys = array('f', reader.read(4 * self.SIZE))
+        self.flips = bytearray(reader.read(self.SIZE))
+
+
+class CollisionMask:
+    masks = {}
+
+    def __init__(self, rows: list[int], w: int, h: int, margin: int) -> None:
+        self.rows = rows
+        self.w = w
+        self.h = h
+        self.margin = margin
+
+    @classmethod
+    def get(cls, image: Any, flip: bool, margin: int = 0) -> 'CollisionMask':
+        key = (image.I, image.U, image.V, image.W, image.H, image.COLKEY, flip, margin)
+        mask = cls.masks.get(key)
+        if mask is None:
+            mask = cls.masks[key] = cls.build(image, flip, margin)
+        return mask
+
+    @classmethod
+    def build(cls, image: Any, flip: bool, margin: int) -> 'CollisionMask':
+        bank = pyxel.images[image.I]
+        rows = []
+        for y in range(image.H):
+            row = 0
+            for x in range(image.W):
+                if bank.pget(image.U + x, image.V + y) != image.COLKEY:
+                    row |= 1 << (image.W - 1 - x if flip else x)
+            rows.append(row << margin)
+        if margin > 0:
+            rows = [0] * margin + rows + [0] * margin
+            spread = []
+            for row in rows:
+                for _ in range(margin):
+                    row |= row << 1 | row >> 1
+                spread.append(row)
+            rows = []
+            for y in range(len(spread)):
+                row = 0
+                for other in spread[max(0, y - margin) : y + margin + 1]:
+                    row |= other
+                rows.append(row)
+        return cls(rows, image.W, image.H, margin)
+
+    def hit(self, x: int, y: int) -> bool:
+        x += self.margin
+        y += self.margin
+        if not (0 <= y < len(self.rows) and x >= 0):
+            return False
+        return self.rows[y] >> x & 1 == 1
 
 
 class Obake:
@@ -461,25 +2111,31 @@ class Obake:
     MIN_FLIP_COUNT = 120
     MAX_FLIP_COUNT = 300
     APPEAR_TIME = 20
+    SCORE = 1000
 
-    def __init__(self, x: int, y: int, delay: int) -> None:
+    def __init__(
+        self, x: int, y: int, delay: int, rng: random.Random, speed: float = 1.0
+    ) -> None:
         self.x = x
         self.y = y
-        if self.obake_image is None:
-            self.obake_image = ObakeImage()
         self.delay = delay
-        if random.random() < 0.5:
-            self.direction = [self.LATERAL_SPEED, -self.UP_SPEED]
+        self.rng = rng
+        if rng.random() < 0.5:
+            self.direction = [self.LATERAL_SPEED * speed, -self.UP_SPEED * speed]
         else:
-            self.direction = [-self.LATERAL_SPEED, -self.UP_SPEED]
+            self.direction = [-self.LATERAL_SPEED * speed, -self.UP_SPEED * speed]
         self.active = True
         self.count = 0
         self.next_flip_count = 0
+        self.history = PositionHistory()
 
     def update(self) -> None:
         self.count += 1
-        if not self.is_active() or self.is_waiting() or self.is_appearing():
-            return
+        if self.is_active() and not self.is_waiting() and not self.is_appearing():
+            self.move()
+        self.history.push(self.x, self.y, self.is_flip())
+
+    def move(self) -> None:
         if self.count % (self.ZIGZAG_DURATION * 2) < self.ZIGZAG_DURATION:
             self.x += self.direction[0] + 0.5 * (self.direction[0] + self.direction[1])
             self.y += self.direction[1] + 0.5 * (-self.direction[0] + self.direction[1])
@@ -488,7 +2144,7 @@ class Obake:
             self.y += self.direction[1] + 0.5 * (self.direction[0] + self.direction[1])
         if self.next_flip_count < self.count or self.is_edge():
             self.direction[0] = -self.direction[0]
-            self.next_flip_count = self.count + random.randint(
+            self.next_flip_count = self.count + self.rng.randint(
                 self.MIN_FLIP_COUNT, self.MAX_FLIP_COUNT
             )
         if self.is_outside():
@@ -508,21 +2164,59 @@ class Obake:
             # go right
             return self.x + self.W >= WINDOW_W
 
-    def shot(self, position: list[float]) -> None:
+    def shot(self, position: list[float], rewind: int = 0) -> bool:
         if not self.is_active() or self.is_waiting() or self.is_appearing():
-            return
-        if self.collision(position[0] * WINDOW_W, position[1] * WINDOW_H):
-            Score.add_score(self.x, self.y, 1000)
-            if self.direction[0] < 0:
-                ObakeDeadParticle.add_particle(self.x, self.y, False)
-            else:
-                ObakeDeadParticle.add_particle(self.x, self.y, True)
+            return False
+        if rewind > 0:
+            x, y, flip = self.history.position(rewind)
+        else:
+            x, y, flip = self.x, self.y, self.is_flip()
+        if self.collision(position[0] * WINDOW_W, position[1] * WINDOW_H, x, y, flip):
             self.active = False
+            return True
+        return False
 
-    def collision(self, sx: int, sy: int) -> bool:
-        return (
-            -self.COLLISION_MARGIN <= sx - self.x < self.W + self.COLLISION_MARGIN
-        ) and (-self.COLLISION_MARGIN <= sy - self.y < self.H + self.COLLISION_MARGIN)
+    def is_flip(self) -> bool:
+        return self.direction[0] >= 0
+
+    def collision(self, sx: int, sy: int, x: float, y: float, flip: bool) -> bool:
+        if not (
+            (-self.COLLISION_MARGIN <= sx - x < self.W + self.COLLISION_MARGIN)
+            and (-self.COLLISION_MARGIN <= sy - y < self.H + self.COLLISION_MARGIN)
+        ):
+            return False
+        self.load()
+        mask = CollisionMask.get(self.obake_image, flip, self.COLLISION_MARGIN)
+        return mask.hit(math.floor(sx - x), math.floor(sy - y))
+
+    def save_state(self, writer: StateWriter) -> None:
+        writer.pack(
+            'ddHII2d?',
+            self.x,
+            self.y,
+            self.delay,
+            self.count,
+            self.next_flip_count,
+            *self.direction,
+            self.active,
+        )
+        self.history.save_state(writer)
+
+    @classmethod
+    def from_state(cls, reader: StateReader, rng: random.Random) -> 'Obake':
+        obake = cls.__new__(cls)
+        obake.rng = rng
+        x, y, delay, count, next_flip_count, dx, dy, active = reader.unpack('ddHII2d?')
+        obake.x = x
+        obake.y = y
+        obake.delay = delay
+        obake.count = count
+        obake.next_flip_count = next_flip_count
+        obake.direction = [dx, dy]
+        obake.active = active
+        obake.history = PositionHistory()
+        obake.history.load_state(reader)
+        return obake
 
     def is_active(self) -> bool:
         return self.active
@@ -533,17 +2227,19 @@ class Obake:
     def is_appearing(self) -> bool:
         return self.delay < self.count < self.delay + self.APPEAR_TIME
 
-    def draw(self) -> None:
+    @classmethod
+    def load(cls):
+        if cls.obake_image is None:
+            cls.obake_image = ObakeImage()
+
+    def draw(self, fade: bool = True) -> None:
         if not self.is_active() or self.is_waiting():
             return
-        if self.is_appearing():
+        self.load()
+        dither = 1
+        if self.is_appearing() and fade:
             dither = max(0, min(1, (self.count - self.delay) / self.APPEAR_TIME))
-            pyxel.dither(dither)
-        if self.direction[0] < 0:
-            self.obake_image.draw(self.x, self.y, False)
-        else:
-            self.obake_image.draw(self.x, self.y, True)
-        pyxel.dither(1)
+        self.obake_image.draw(self.x, self.y, self.is_flip(), alpha=dither)
 
 
 class BackGroundImage:
@@ -563,16 +2259,20 @@ class BackGroundImage:
         pyxel.images[self.I].load(self.U, self.V, self.ASSET_FILE)
 
     def draw(self) -> None:
-        pyxel.blt(self.X, self.Y, self.I, self.U, self.V, self.W, self.H)
+        renderer.blt(self.X, self.Y, self.I, self.U, self.V, self.W, self.H)
 
 
 class BackGround:
     back_ground_image = None
 
     @classmethod
-    def draw(cls):
+    def load(cls):
         if cls.back_ground_image is None:
             cls.back_ground_image = BackGroundImage()
+
+    @classmethod
+    def draw(cls):
+        cls.load()
         cls.back_ground_image.draw()
 
 
@@ -594,7 +2294,7 @@ class BulletImage:
         pyxel.images[self.I].load(self.U, self.V, self.ASSET_FILE)
 
     def draw(self, x: int, y: int) -> None:
-        pyxel.blt(x, y, self.I, self.U, self.V, self.W, self.H, self.COLKEY)
+        renderer.blt(x, y, self.I, self.U, self.V, self.W, self.H, self.COLKEY)
 
 
 class BulletEmptyImage:
@@ -615,10 +2315,13 @@ class BulletEmptyImage:
         pyxel.images[self.I].load(self.U, self.V, self.ASSET_FILE)
 
     def draw(self, x: int, y: int) -> None:
-        pyxel.blt(x, y, self.I, self.U, self.V, self.W, self.H, self.COLKEY)
+        renderer.blt(x, y, self.I, self.U, self.V, self.W, self.H, self.COLKEY)
 
 
 class BulletUI:
+    bullet_image = None
+    bullet_empty_image = None
+
     X = 100
     Y = 190
     W = 56
@@ -628,14 +2331,20 @@ class BulletUI:
     MARGIN_X = 13
     MARGIN_Y = 10
 
-    def __init__(self) -> None:
-        self.bullet_image = BulletImage()
-        self.bullet_empty_image = BulletEmptyImage()
+    def __init__(self, x: int = X) -> None:
+        self.x = x
+        self.load()
+
+    @classmethod
+    def load(cls):
+        if cls.bullet_image is None:
+            cls.bullet_image = BulletImage()
+            cls.bullet_empty_image = BulletEmptyImage()
 
     def draw(self, num: int) -> None:
         for i in range(2):
             for j in range(3):
-                x = self.X + j * (self.BULLET_W + self.MARGIN_X)
+                x = self.x + j * (self.BULLET_W + self.MARGIN_X)
                 y = self.Y + i * (self.BULLET_H + self.MARGIN_Y)
                 if (1 - i) * 3 + j < num:
                     self.bullet_image.draw(x, y)
@@ -662,20 +2371,28 @@ class ReloadImage:
         h = int(self.H * min(max(progress, 0), 1))
         y = y + self.H - h
         v = self.V + self.H - h
-        pyxel.blt(x, y, self.I, self.U, v, self.W, h, self.COLKEY)
+        renderer.blt(x, y, self.I, self.U, v, self.W, h, self.COLKEY)
 
 
 class ReloadUI:
+    reload_image = None
+
     W = 68
     H = 21
     X = BulletUI.X + (BulletUI.W - W) // 2
     Y = BulletUI.Y + (BulletUI.H - H) // 2
 
-    def __init__(self) -> None:
-        self.reload_image = ReloadImage()
+    def __init__(self, x: int = X) -> None:
+        self.x = x
+        self.load()
+
+    @classmethod
+    def load(cls):
+        if cls.reload_image is None:
+            cls.reload_image = ReloadImage()
 
     def draw(self, progress: float) -> None:
-        self.reload_image.draw(self.X, self.Y, progress)
+        self.reload_image.draw(self.x, self.Y, progress)
 
 
 class BulletManager:
@@ -683,12 +2400,17 @@ class BulletManager:
     RELOAD_TIME = 60
     RELOAD_DISPLAY_OFFSET = 0.1
 
-    def __init__(self) -> None:
-        self.bullet_ui = BulletUI()
-        self.reload_ui = ReloadUI()
+    def __init__(self, x: int = BulletUI.X) -> None:
+        self.x = x
+        self.bullet_ui = None
+        self.reload_ui = None
         self.bullet_num = self.BULLET_MAX_NUM
         self.reload_count = self.RELOAD_TIME
 
+    @classmethod
+    def ui_x(cls, player: int, player_num: int) -> int:
+        return WINDOW_W * (2 * player + 1) // (2 * player_num) - BulletUI.W // 2
+
     def update(self) -> None:
         if self.reload_count < self.RELOAD_TIME:
             self.reload_count += 1
@@ -703,14 +2425,22 @@ class BulletManager:
         self.bullet_num -= 1
         return True
 
-    def reload(self) -> None:
+    def reload(self) -> bool:
         if self.reload_count == self.RELOAD_TIME and not self.is_max_of_ammo():
             self.reload_count = 0
+            return True
+        return False
 
     def reset(self) -> None:
         self.bullet_num = self.BULLET_MAX_NUM
         self.reload_count = self.RELOAD_TIME
 
+    def save_state(self, writer: StateWriter) -> None:
+        writer.pack('BH', self.bullet_num, self.reload_count)
+
+    def load_state(self, reader: StateReader) -> None:
+        self.bullet_num, self.reload_count = reader.unpack('BH')
+
     def is_reloading(self) -> bool:
         return self.reload_count < self.RELOAD_TIME
 
@@ -720,7 +2450,13 @@ class BulletManager:
     def is_max_of_ammo(self) -> bool:
         return self.bullet_num >= self.BULLET_MAX_NUM
 
+    def load(self) -> None:
+        if self.bullet_ui is None:
+            self.bullet_ui = BulletUI(self.x)
+            self.reload_ui = ReloadUI(self.x + (BulletUI.W - ReloadUI.W) // 2)
+
     def draw(self) -> None:
+        self.load()
         self.bullet_ui.draw(self.bullet_num)
         if self.reload_count < self.RELOAD_TIME:
             self.reload_ui.draw(
@@ -748,7 +2484,7 @@ class NumberImage:
         for digit in str(number):
             u = self.U + self.NUMBER_W * int(digit)
             w = self.NUMBER_W
-            pyxel.blt(x, y, self.I, u, self.V, w, self.H, self.COLKEY)
+            renderer.blt(x, y, self.I, u, self.V, w, self.H, self.COLKEY)
             x = x + self.NUMBER_W
 
 
@@ -775,17 +2511,12 @@ class LargeNumberImage:
             else:
                 u = self.U + self.NUMBER_W * int(digit)
             w = self.NUMBER_W
-            pyxel.blt(x, y, self.I, u, self.V, w, self.H, self.COLKEY)
+            renderer.blt(x, y, self.I, u, self.V, w, self.H, self.COLKEY)
             x = x + self.NUMBER_W
 
 
 class Score:
-    score_list = []
-    total = 0
-    number_image = None
     COUNT_TIME = 30
-    TOTAL_MARGIN_X = 10
-    TOTAL_MARGIN_Y = 10
 
     def __init__(self, x: int, y: int, score: int, count: int) -> None:
         self.x = x
@@ -800,39 +2531,71 @@ class Score:
         if self.count == 0:
             self.active = False
 
-    def _draw(self) -> None:
+    def _draw(self, number_image: NumberImage) -> None:
         y = self.y - (self.COUNT_TIME - self.count) // 2
-        self.number_image.draw(self.x, y, self.score)
+        number_image.draw(self.x, y, self.score)
 
-    @classmethod
-    def add_score(cls, x: int, y: int, score: int):
-        if cls.number_image is not None:
-            cls.score_list.append(Score(x, y, score, cls.COUNT_TIME))
-            cls.total += score
+
+class ScoreManager:
+    number_image = None
+    TOTAL_MARGIN_X = 10
+    TOTAL_MARGIN_Y = 10
+    PLAYER_TOTAL_Y = BulletUI.Y - 12
+
+    def __init__(self, player_num: int = 1) -> None:
+        self.reset(player_num)
+
+    def add_score(self, x: int, y: int, score: int, player: int = 0) -> None:
+        self.score_list.append(Score(x, y, score, Score.COUNT_TIME))
+        self.total += score
+        self.player_total[player] += score
 
     @classmethod
     def load(cls):
         if cls.number_image is None:
             cls.number_image = NumberImage()
 
-    @classmethod
-    def reset(cls):
-        cls.score_list = []
-        cls.total = 0
+    def reset(self, player_num: int = 1) -> None:
+        self.score_list: list[Score] = []
+        self.total = 0
+        self.player_total = [0] * player_num
+
+    def save_state(self, writer: StateWriter) -> None:
+        writer.pack('qB', self.total, len(self.player_total))
+        writer.pack('{}q'.format(len(self.player_total)), *self.player_total)
+        writer.pack('H', len(self.score_list))
+        for score in self.score_list:
+            writer.pack('ddiH?', score.x, score.y, score.score, score.count, score.active)
+
+    def load_state(self, reader: StateReader) -> None:
+        self.total, player_num = reader.unpack('qB')
+        self.player_total = list(reader.unpack('{}q'.format(player_num)))
+        (score_num,) = reader.unpack('H')
+        self.score_list = []
+        for _ in range(score_num):
+            x, y, score, count, active = reader.unpack('ddiH?')
+            self.score_list.append(Score(x, y, score, count))
+            self.score_list[-1].active = active
 
-    @classmethod
-    def update(cls):
-        for score in cls.score_list:
+    def update(self) -> None:
+        for score in self.score_list:
             score._update()
-        cls.score_list = [score for score in cls.score_list if score.active]
+        self.score_list = [score for score in self.score_list if score.active]
 
-    @classmethod
-    def draw(cls):
-        for score in cls.score_list:
-            score._draw()
-        tx = WINDOW_W - cls.TOTAL_MARGIN_X - NumberImage.NUMBER_W * len(str(cls.total))
-        ty = WINDOW_H - cls.TOTAL_MARGIN_Y - NumberImage.H
-        cls.number_image.draw(tx, ty, cls.total)
+    def draw(self) -> None:
+        self.load()
+        for score in self.score_list:
+            score._draw(self.number_image)
+        player_num = len(self.player_total)
+        if player_num > 1:
+            for player, total in enumerate(self.player_total):
+                x = BulletManager.ui_x(player, player_num)
+                renderer.text(x, self.PLAYER_TOTAL_Y + 2, 'P{}'.format(player + 1), 7)
+                self.number_image.draw(x + 12, self.PLAYER_TOTAL_Y, total)
+            return
+        tx = WINDOW_W - self.TOTAL_MARGIN_X - NumberImage.NUMBER_W * len(str(self.total))
+        ty = WINDOW_H - self.TOTAL_MARGIN_Y - NumberImage.H
+        self.number_image.draw(tx, ty, self.total)
 
 
 class Wave:
@@ -861,24 +2624,98 @@ class Wave:
 
     SPAWN_DELAY = 120
 
-    def __init__(self) -> None:
-        self.wave_count = 0
+    # difficulty curve of the endless mode, by wave number
+    ENDLESS_START_NUM = 2
+    ENDLESS_NUM_STEP = 3
+    ENDLESS_MAX_GROUPS = 3
+    ENDLESS_GROUP_STEP = 6
+    ENDLESS_DELAY_DECAY = 0.96
+    ENDLESS_MIN_DELAY = 45
+    ENDLESS_SPEED_STEP = 0.03
+    ENDLESS_MAX_SPEED = 2.0
+
+    def __init__(
+        self, rng: random.Random, obake_rng: random.Random, endless: bool = False
+    ) -> None:
+        self.rng = rng
+        self.obake_rng = obake_rng
+        self.endless = endless
+        self.reset()
+
+    def waves(self, start: int = 0) -> Iterator[tuple[tuple[int, ...], int, float]]:
+        if not self.endless:
+            for spawn_num in self.SPAWN_NUM[start:]:
+                yield spawn_num, self.SPAWN_DELAY, 1.0
+            return
+        for level in itertools.count(start):
+            yield self.endless_wave(level)
 
-    def spawn(self) -> list[Obake]:
-        if self.wave_count == len(self.SPAWN_NUM):
-            return []
+    @classmethod
+    def endless_wave(cls, level: int) -> tuple[tuple[int, ...], int, float]:
+        spawn_num = min(
+            cls.ENDLESS_START_NUM + level // cls.ENDLESS_NUM_STEP, len(cls.SPAWN_POINT)
+        )
+        group_num = min(1 + level // cls.ENDLESS_GROUP_STEP, cls.ENDLESS_MAX_GROUPS)
+        delay = max(cls.ENDLESS_MIN_DELAY, int(cls.SPAWN_DELAY * cls.ENDLESS_DELAY_DECAY**level))
+        speed = min(1 + cls.ENDLESS_SPEED_STEP * level, cls.ENDLESS_MAX_SPEED)
+        return (spawn_num,) * group_num, delay, speed
+
+    @staticmethod
+    def schedule(spawn_num: tuple[int, ...], spawn_delay: int) -> Iterator[tuple[int, int]]:
+        # spawn points are drawn when a group is due, so a wave is resumable by group index
+        for i, num in enumerate(spawn_num):
+            yield spawn_delay * i, num
+
+    def start_wave(
+        self, wave: tuple[tuple[int, ...], int, float], group_count: int = 0
+    ) -> None:
+        spawn_num, spawn_delay, self.speed = wave
+        self.pending = itertools.islice(self.schedule(spawn_num, spawn_delay), group_count, None)
+        self.next_spawn = next(self.pending, None)
+        self.group_count = group_count
+
+    def spawn(self) -> bool:
+        wave = next(self.wave_iter, None)
+        if wave is None:
+            return False
+        self.start_wave(wave)
+        self.frame = 0
+        self.wave_count += 1
+        return True
 
+    def update(self) -> list[Obake]:
         obake_list = []
-        for i, spawn_num in enumerate(self.SPAWN_NUM[self.wave_count]):
-            for x, y in random.sample(self.SPAWN_POINT, spawn_num):
-                delay = self.SPAWN_DELAY * i
-                obake_list.append(Obake(x, y, delay))
-
-        self.wave_count += 1
+        while self.next_spawn is not None and self.next_spawn[0] <= self.frame:
+            for x, y in self.rng.sample(self.SPAWN_POINT, self.next_spawn[1]):
+                obake_list.append(Obake(x, y, 0, self.obake_rng, self.speed))
+            self.group_count += 1
+            self.next_spawn = next(self.pending, None)
+        self.spawn_count += len(obake_list)
+        self.frame += 1
         return obake_list
 
+    def is_spawning(self) -> bool:
+        return self.next_spawn is not None
+
     def reset(self):
         self.wave_count = 0
+        self.spawn_count = 0
+        self.frame = 0
+        self.speed = 1.0
+        self.group_count = 0
+        self.wave_iter = self.waves()
+        self.pending: Iterator[tuple[int, int]] = iter(())
+        self.next_spawn: tuple[int, int] | None = None
+
+    def save_state(self, writer: StateWriter) -> None:
+        writer.pack('IIIB', self.wave_count, self.spawn_count, self.frame, self.group_count)
+
+    def load_state(self, reader: StateReader) -> None:
+        self.reset()
+        self.wave_count, self.spawn_count, self.frame, group_count = reader.unpack('IIIB')
+        if self.wave_count > 0:
+            self.start_wave(next(self.waves(self.wave_count - 1)), group_count)
+        self.wave_iter = self.waves(self.wave_count)
 
 
 class TitleImage:
@@ -898,7 +2735,7 @@ class TitleImage:
         pyxel.images[self.I].load(self.U, self.V, self.ASSET_FILE)
 
     def draw(self) -> None:
-        pyxel.blt(self.X, self.Y, self.I, self.U, self.V, self.W, self.H)
+        renderer.blt(self.X, self.Y, self.I, self.U, self.V, self.W, self.H)
 
 
 class StartImage:
@@ -918,7 +2755,7 @@ class StartImage:
         pyxel.images[self.I].load(self.U, self.V, self.ASSET_FILE)
 
     def draw(self) -> None:
-        pyxel.blt(self.X, self.Y, self.I, self.U, self.V, self.W, self.H)
+        renderer.blt(self.X, self.Y, self.I, self.U, self.V, self.W, self.H)
 
 
 class SensImage:
@@ -938,7 +2775,7 @@ class SensImage:
         pyxel.images[self.I].load(self.U, self.V, self.ASSET_FILE)
 
     def draw(self) -> None:
-        pyxel.blt(self.X, self.Y, self.I, self.U, self.V, self.W, self.H)
+        renderer.blt(self.X, self.Y, self.I, self.U, self.V, self.W, self.H)
 
 
 class UpDownButtonImage:
@@ -958,14 +2795,16 @@ class UpDownButtonImage:
 
     def draw(self, x, y, up: bool) -> None:
         if up:
-            pyxel.blt(
+            renderer.blt(
                 x, y, self.I, self.U + self.BUTTON_W, self.V, self.BUTTON_W, self.H
             )
         else:
-            pyxel.blt(x, y, self.I, self.U, self.V, self.BUTTON_W, self.H)
+            renderer.blt(x, y, self.I, self.U, self.V, self.BUTTON_W, self.H)
 
 
 class UpDownButton:
+    up_down_image = None
+
     W = UpDownButtonImage.BUTTON_W
     H = UpDownButtonImage.H
 
@@ -973,7 +2812,6 @@ class UpDownButton:
         self.x = x
         self.y = y
         self.up = up
-        self.up_down_image = UpDownButtonImage()
 
     def collision(self, x, y) -> bool:
         if self.x <= x <= self.x + self.W:
@@ -981,7 +2819,13 @@ class UpDownButton:
                 return True
         return False
 
+    @classmethod
+    def load(cls):
+        if cls.up_down_image is None:
+            cls.up_down_image = UpDownButtonImage()
+
     def draw(self) -> None:
+        self.load()
         self.up_down_image.draw(self.x, self.y, self.up)
 
 
@@ -991,18 +2835,31 @@ class TitleMenu:
     DOWN_BUTTON_X = WINDOW_W // 2 + 10
     UP_BUTTON_X = WINDOW_W - 10 - UpDownButton.W
 
+    PLAYER_BUTTON_Y = SensImage.Y + SensImage.H + 6
+    PLAYER_NUMBER_Y = PLAYER_BUTTON_Y + UpDownButton.H // 2 - LargeNumberImage.H // 2
+    PLAYER_TEXT_X = DOWN_BUTTON_X - 50
+    PLAYER_TEXT_Y = PLAYER_BUTTON_Y + UpDownButton.H // 2 - 3
+
     MAX_SENS = 1
     MIN_SENS = 0.1
     SENS_RESOLUTION = 0.1
 
-    def __init__(self, init_sens: float) -> None:
+    MAX_PLAYER_NUM = MediapipeManager.MAX_HAND_NUM
+    MIN_PLAYER_NUM = 1
+
+    def __init__(self, init_sens: float, init_player_num: int = 1) -> None:
         self.sens = init_sens
+        self.player_num = init_player_num
         self.up_button = UpDownButton(self.UP_BUTTON_X, self.BUTTON_Y, True)
         self.down_button = UpDownButton(self.DOWN_BUTTON_X, self.BUTTON_Y, False)
-        self.title_image = TitleImage()
-        self.start_image = StartImage()
-        self.sens_image = SensImage()
-        self.large_number_image = LargeNumberImage()
+        self.player_up_button = UpDownButton(self.UP_BUTTON_X, self.PLAYER_BUTTON_Y, True)
+        self.player_down_button = UpDownButton(
+            self.DOWN_BUTTON_X, self.PLAYER_BUTTON_Y, False
+        )
+        self.title_image = None
+        self.start_image = None
+        self.sens_image = None
+        self.large_number_image = None
 
     def update(self) -> None:
         pass
@@ -1015,6 +2872,10 @@ class TitleMenu:
             self.sens_increment()
         if self.down_button.collision(x, y):
             self.sens_decrement()
+        if self.player_up_button.collision(x, y):
+            self.player_num = min(self.player_num + 1, self.MAX_PLAYER_NUM)
+        if self.player_down_button.collision(x, y):
+            self.player_num = max(self.player_num - 1, self.MIN_PLAYER_NUM)
         return False
 
     def sens_increment(self):
@@ -1023,7 +2884,26 @@ class TitleMenu:
     def sens_decrement(self):
         self.sens = max(self.sens - self.SENS_RESOLUTION, self.MIN_SENS)
 
+    def number_x(self, number: str) -> int:
+        return (
+            self.DOWN_BUTTON_X
+            + UpDownButton.W
+            + (
+                (self.UP_BUTTON_X - self.DOWN_BUTTON_X - UpDownButton.W)
+                - len(number) * LargeNumberImage.NUMBER_W
+            )
+            // 2
+        )
+
+    def load(self) -> None:
+        if self.title_image is None:
+            self.title_image = TitleImage()
+            self.start_image = StartImage()
+            self.sens_image = SensImage()
+            self.large_number_image = LargeNumberImage()
+
     def draw(self) -> None:
+        self.load()
         self.title_image.draw()
         self.start_image.draw()
         self.sens_image.draw()
@@ -1032,16 +2912,15 @@ class TitleMenu:
         self.down_button.draw()
 
         sens = '{:.1f}'.format(self.sens)
-        number_x = (
-            self.DOWN_BUTTON_X
-            + UpDownButton.W
-            + (
-                (self.UP_BUTTON_X - self.DOWN_BUTTON_X - UpDownButton.W)
-                - len(sens) * LargeNumberImage.NUMBER_W
-            )
-            // 2
+        self.large_number_image.draw(self.number_x(sens), self.NUMBER_Y, sens)
+
+        self.player_up_button.draw()
+        self.player_down_button.draw()
+        renderer.text(self.PLAYER_TEXT_X, self.PLAYER_TEXT_Y, 'PLAYERS', 7)
+        player_num = str(self.player_num)
+        self.large_number_image.draw(
+            self.number_x(player_num), self.PLAYER_NUMBER_Y, player_num
         )
-        self.large_number_image.draw(number_x, self.NUMBER_Y, sens)
 
 
 class FinishImage:
@@ -1060,7 +2939,7 @@ class FinishImage:
         pyxel.images[self.I].load(self.U, self.V, self.ASSET_FILE)
 
     def draw(self, x, y) -> None:
-        pyxel.blt(x, y, self.I, self.U, self.V, self.W, self.H, self.COLKEY)
+        renderer.blt(x, y, self.I, self.U, self.V, self.W, self.H, self.COLKEY)
 
 
 class ScoreImage:
@@ -1079,7 +2958,7 @@ class ScoreImage:
         pyxel.images[self.I].load(self.U, self.V, self.ASSET_FILE)
 
     def draw(self, x, y) -> None:
-        pyxel.blt(x, y, self.I, self.U, self.V, self.W, self.H, self.COLKEY)
+        renderer.blt(x, y, self.I, self.U, self.V, self.W, self.H, self.COLKEY)
 
 
 class BackButtonImage:
@@ -1098,17 +2977,18 @@ class BackButtonImage:
         pyxel.images[self.I].load(self.U, self.V, self.ASSET_FILE)
 
     def draw(self, x, y) -> None:
-        pyxel.blt(x, y, self.I, self.U, self.V, self.W, self.H, self.COLKEY)
+        renderer.blt(x, y, self.I, self.U, self.V, self.W, self.H, self.COLKEY)
 
 
 class BackButton:
+    back_button_image = None
+
     W = BackButtonImage.W
     H = BackButtonImage.H
 
     def __init__(self, x, y) -> None:
         self.x = x
         self.y = y
-        self.back_button_image = BackButtonImage()
 
     def collision(self, x, y) -> bool:
         if self.x <= x <= self.x + self.W:
@@ -1116,22 +2996,24 @@ class BackButton:
                 return True
         return False
 
+    @classmethod
+    def load(cls):
+        if cls.back_button_image is None:
+            cls.back_button_image = BackButtonImage()
+
     def draw(self) -> None:
+        self.load()
         self.back_button_image.draw(self.x, self.y)
 
 
 class ObakeParticle:
-    obake_particle_list = []
-    obake_image = None
     SPEED = 1
-    INTERVAL = 5
-    MAX_RATE_SCORE = 40000
 
-    def __init__(self) -> None:
-        self.x = random.randint(0, WINDOW_W)
+    def __init__(self, rng: random.Random) -> None:
+        self.x = rng.randint(0, WINDOW_W)
         self.y = WINDOW_H
-        self.flip = random.random() < 0.5
-        self.color = random.randint(1, 15)
+        self.flip = rng.random() < 0.5
+        self.color = rng.randint(1, 15)
         self.active = True
 
     def _update(self) -> None:
@@ -1139,42 +3021,67 @@ class ObakeParticle:
         if self.y + ObakeDeadImage.H < 0:
             self.active = False
 
-    def _draw(self) -> None:
-        if self.obake_image is not None:
-            pyxel.pal(7, self.color)
-            self.obake_image.draw(self.x, self.y, self.flip)
-            pyxel.pal()
+    def _draw(self, obake_image: ObakeImage) -> None:
+        obake_image.draw(self.x, self.y, self.flip, ((7, self.color),))
 
-    @classmethod
-    def add_particle(cls):
-        cls.obake_particle_list.append(ObakeParticle())
+
+class ObakeParticleManager:
+    obake_image = None
+    INTERVAL = 5
+    MAX_RATE_SCORE = 40000
+
+    def __init__(self, rng: random.Random) -> None:
+        self.obake_particle_list: list[ObakeParticle] = []
+        self.frame_count = 0
+        self.rng = rng
+
+    def add_particle(self) -> None:
+        self.obake_particle_list.append(ObakeParticle(self.rng))
 
     @classmethod
     def load(cls):
         if cls.obake_image is None:
             cls.obake_image = ObakeImage()
 
-    @classmethod
-    def reset(cls):
-        cls.obake_particle_list = []
+    def reset(self) -> None:
+        self.obake_particle_list = []
+        self.frame_count = 0
+
+    def save_state(self, writer: StateWriter) -> None:
+        writer.pack('IH', self.frame_count, len(self.obake_particle_list))
+        for particle in self.obake_particle_list:
+            writer.pack(
+                'hh?B?', particle.x, particle.y, particle.flip, particle.color, particle.active
+            )
 
-    @classmethod
-    def update(cls):
+    def load_state(self, reader: StateReader) -> None:
+        self.frame_count, particle_num = reader.unpack('IH')
+        self.obake_particle_list = []
+        for _ in range(particle_num):
+            particle = ObakeParticle.__new__(ObakeParticle)
+            particle.x, particle.y, particle.flip, particle.color, particle.active = (
+                reader.unpack('hh?B?')
+            )
+            self.obake_particle_list.append(particle)
+
+    def update(self, total: int, particle_interval: int = 1) -> None:
+        interval = self.INTERVAL * particle_interval
         if (
-            pyxel.frame_count % cls.INTERVAL == 0
-            and random.random() < Score.total / cls.MAX_RATE_SCORE
+            self.frame_count % interval == 0
+            and self.rng.random() < total / self.MAX_RATE_SCORE
         ):
-            cls.add_particle()
-        for particle in cls.obake_particle_list:
+            self.add_particle()
+        self.frame_count += 1
+        for particle in self.obake_particle_list:
             particle._update()
-        cls.obake_particle_list = [
-            particle for particle in cls.obake_particle_list if particle.active
+        self.obake_particle_list = [
+            particle for particle in self.obake_particle_list if particle.active
         ]
 
-    @classmethod
-    def draw(cls):
-        for particle in cls.obake_particle_list:
-            particle._draw()
+    def draw(self) -> None:
+        self.load()
+        for particle in self.obake_particle_list:
+            particle._draw(self.obake_image)
 
 
 class Result:
@@ -1182,14 +3089,15 @@ class Result:
     FINISH_Y = WINDOW_H // 4
 
     SCORE_Y = WINDOW_H // 2
+    PLAYER_SCORE_Y = SCORE_Y + LargeNumberImage.H + 8
 
     BACK_BUTTON_X = (WINDOW_W - BackButton.W) // 2
     BACK_BUTTON_Y = WINDOW_H // 4 * 3
 
     def __init__(self) -> None:
-        self.finish_image = FinishImage()
-        self.score_image = ScoreImage()
-        self.large_number_image = LargeNumberImage()
+        self.finish_image = None
+        self.score_image = None
+        self.large_number_image = None
         self.back_button = BackButton(self.BACK_BUTTON_X, self.BACK_BUTTON_Y)
 
     def update(self) -> None:
@@ -1198,10 +3106,18 @@ class Result:
     def select(self, x, y) -> bool:
         return self.back_button.collision(x, y)
 
-    def draw(self) -> None:
+    def load(self) -> None:
+        if self.finish_image is None:
+            self.finish_image = FinishImage()
+            self.score_image = ScoreImage()
+            self.large_number_image = LargeNumberImage()
+            self.back_button.load()
+
+    def draw(self, score_manager: ScoreManager) -> None:
+        self.load()
         self.finish_image.draw(self.FINISH_X, self.FINISH_Y)
 
-        score = str(Score.total)
+        score = str(score_manager.total)
         score_image_and_score_width = ScoreImage.W + LargeNumberImage.NUMBER_W * (
             len(score) + 1
         )
@@ -1210,160 +3126,1312 @@ class Result:
         self.score_image.draw(score_image_x, self.SCORE_Y)
         self.large_number_image.draw(score_x, self.SCORE_Y, score)
 
+        if len(score_manager.player_total) > 1:
+            player_score = '  '.join(
+                'P{} {}'.format(player + 1, total)
+                for player, total in enumerate(score_manager.player_total)
+            )
+            x = (WINDOW_W - len(player_score) * 4) // 2
+            renderer.text(x, self.PLAYER_SCORE_Y, player_score, 7)
+
         self.back_button.draw()
 
 
 class ShakeEffect:
-    count = 0
     BREADTH = 3
     SHAKE_TIME = 10
 
+    def __init__(self, rng: random.Random) -> None:
+        self.count = 0
+        self.offset = (0.0, 0.0)
+        self.rng = rng
+
+    def update(self) -> None:
+        # the offset is applied by the draw path only where the quality allows
+        # shaking, replays re-simulate the same state whatever the level was
+        if self.count > 0:
+            self.count -= 1
+        dx = self.rng.randint(-self.BREADTH, self.BREADTH) * self.count / self.SHAKE_TIME
+        dy = self.rng.randint(-self.BREADTH, self.BREADTH) * self.count / self.SHAKE_TIME
+        self.offset = (dx, dy)
+
+    def shake(self) -> None:
+        self.count = self.SHAKE_TIME
+
+    def reset(self) -> None:
+        self.count = 0
+        self.offset = (0.0, 0.0)
+
+    def save_state(self, writer: StateWriter) -> None:
+        writer.pack('B', self.count)
+
+    def load_state(self, reader: StateReader) -> None:
+        (self.count,) = reader.unpack('B')
+
+
+class GameWorld:
+    def __init__(
+        self, player_num: int = 1, seed: int | None = None, endless: bool = False
+    ) -> None:
+        self.player_num = player_num
+        self.endless = endless
+        self.random = RandomStreams(seed)
+        self.seed = self.random.seed
+        self.wave = Wave(self.random.stream('wave'), self.random.stream('obake'), endless)
+        self.obake_list: list[Obake] = []
+        self.bullet_managers = [
+            BulletManager(BulletManager.ui_x(player, player_num))
+            for player in range(player_num)
+        ]
+        self.score_manager = ScoreManager(player_num)
+        self.obake_dead_particle_manager = ObakeDeadParticleManager()
+        self.obake_particle_manager = ObakeParticleManager(self.random.stream('particle'))
+        self.shake_effect = ShakeEffect(self.random.stream('shake'))
+
+    def shoot(self, position: list[float], player: int = 0, rewind: int = 0) -> list[Obake]:
+        hit_list = []
+        for obake in self.obake_list:
+            if obake.shot(position, rewind):
+                self.score_manager.add_score(obake.x, obake.y, Obake.SCORE, player)
+                self.obake_dead_particle_manager.add_particle(
+                    obake.x, obake.y, obake.is_flip()
+                )
+                hit_list.append(obake)
+        return hit_list
+
+    def fire(self, player: int, position: list[float], rewind: int = 0) -> list[Obake] | None:
+        # None when the gun is empty or reloading
+        if not self.bullet_managers[player].shoot():
+            return None
+        hit_list = self.shoot(position, player, rewind)
+        self.shake_effect.shake()
+        return hit_list
+
+    def reload(self, player: int) -> bool:
+        return self.bullet_managers[player].reload()
+
+    def update_bullets(self) -> None:
+        for bullet_manager in self.bullet_managers:
+            bullet_manager.update()
+
+    def update_play(self) -> bool:
+        # False once the last wave is cleared
+        self.update_obake()
+        running = not self.is_wave_clear() or self.spawn()
+        self.update_effects()
+        return running
+
+    def spawn(self) -> bool:
+        return self.wave.spawn()
+
+    def is_wave_clear(self) -> bool:
+        return not self.obake_list and not self.wave.is_spawning()
+
+    def update_obake(self) -> None:
+        self.obake_list.extend(self.wave.update())
+        for obake in self.obake_list:
+            obake.update()
+        self.obake_list = [obake for obake in self.obake_list if obake.is_active()]
+
+    def update_effects(self) -> None:
+        self.score_manager.update()
+        self.obake_dead_particle_manager.update()
+        self.shake_effect.update()
+
+    def update_result(self, particle_interval: int = 1) -> None:
+        self.obake_particle_manager.update(self.score_manager.total, particle_interval)
+
+    def reset(self) -> None:
+        self.obake_list = []
+        self.obake_dead_particle_manager.reset()
+        self.obake_particle_manager.reset()
+        for bullet_manager in self.bullet_managers:
+            bullet_manager.reset()
+        self.wave.reset()
+        self.score_manager.reset(self.player_num)
+        self.shake_effect.reset()
+        self.random.reset()
+
+    def camera_offset(self) -> tuple[float, float]:
+        return self.shake_effect.offset
+
+    # quality settings are passed in by the caller, worlds share no global state
+    def draw_obake(self, appear_fade: bool = True) -> None:
+        for obake in self.obake_list:
+            obake.draw(appear_fade)
+
+    def draw_ui(self, dead_fade: bool = True) -> None:
+        for bullet_manager in self.bullet_managers:
+            bullet_manager.draw()
+        self.score_manager.draw()
+        self.obake_dead_particle_manager.draw(dead_fade)
+
+    def draw_result(self) -> None:
+        self.obake_particle_manager.draw()
+
+    def save_state(self, writer: StateWriter) -> None:
+        writer.pack('Bq?', self.player_num, self.seed, self.endless)
+        self.random.save_state(writer)
+        self.wave.save_state(writer)
+        writer.pack('H', len(self.obake_list))
+        for obake in self.obake_list:
+            obake.save_state(writer)
+        for bullet_manager in self.bullet_managers:
+            bullet_manager.save_state(writer)
+        self.score_manager.save_state(writer)
+        self.obake_dead_particle_manager.save_state(writer)
+        self.obake_particle_manager.save_state(writer)
+        self.shake_effect.save_state(writer)
+
+    @classmethod
+    def from_state(cls, reader: StateReader) -> 'GameWorld':
+        world = cls(*reader.unpack('Bq?'))
+        world.random.load_state(reader)
+        world.wave.load_state(reader)
+        (obake_num,) = reader.unpack('H')
+        obake_rng = world.random.stream('obake')
+        world.obake_list = [Obake.from_state(reader, obake_rng) for _ in range(obake_num)]
+        for bullet_manager in world.bullet_managers:
+            bullet_manager.load_state(reader)
+        world.score_manager.load_state(reader)
+        world.obake_dead_particle_manager.load_state(reader)
+        world.obake_particle_manager.load_state(reader)
+        world.shake_effect.load_state(reader)
+        return world
+
+
+class GameSnapshot:
+    MAGIC = b'OBKS'
+    VERSION = 2
+    HEADER = struct.Struct('<4sH?')
+
+    @classmethod
+    def capture(
+        cls, world: GameWorld, mediapipe_manager: MediapipeManager | None = None
+    ) -> bytes:
+        writer = StateWriter()
+        world.save_state(writer)
+        if mediapipe_manager is not None:
+            mediapipe_manager.save_state(writer)
+        header = cls.HEADER.pack(cls.MAGIC, cls.VERSION, mediapipe_manager is not None)
+        return header + zlib.compress(writer.data)
+
+    @classmethod
+    def restore(
+        cls, data: bytes, mediapipe_manager: MediapipeManager | None = None
+    ) -> GameWorld:
+        magic, version, has_detectors = cls.HEADER.unpack_from(data)
+        if magic != cls.MAGIC or version != cls.VERSION:
+            raise ValueError('not a game snapshot')
+        reader = StateReader(zlib.decompress(data[cls.HEADER.size :]))
+        world = GameWorld.from_state(reader)
+        if has_detectors and mediapipe_manager is not None:
+            mediapipe_manager.load_state(reader)
+        return world
+
+
+class ReplayRecorder:
+    # a keyframe snapshot every KEYFRAME_INTERVAL frames, with the shots and
+    # reloads of every frame in between
+    MAGIC = b'OBKR'
+    VERSION = 1
+    HEADER = struct.Struct('<4sHQ')
+    KEYFRAME = struct.Struct('<BII')
+    INPUT = struct.Struct('<BIBBddH')
+    END = struct.Struct('<BI')
+    KEYFRAME_TAG = 0
+    INPUT_TAG = 1
+    END_TAG = 2
+    SHOT = 0
+    RELOAD = 1
+    KEYFRAME_INTERVAL = FPS * 10
+
+    def __init__(
+        self,
+        world: GameWorld,
+        mediapipe_manager: MediapipeManager | None = None,
+        session_id: int = 0,
+    ) -> None:
+        self.world = world
+        self.mediapipe_manager = mediapipe_manager
+        self.data = bytearray(self.HEADER.pack(self.MAGIC, self.VERSION, session_id))
+        self.frame = 0
+        self.add_keyframe()
+
+    def add_keyframe(self) -> None:
+        snapshot = GameSnapshot.capture(self.world, self.mediapipe_manager)
+        self.data += self.KEYFRAME.pack(self.KEYFRAME_TAG, self.frame, len(snapshot))
+        self.data += snapshot
+
+    def record_shot(self, player: int, position: list[float], rewind: int) -> None:
+        self.data += self.INPUT.pack(
+            self.INPUT_TAG, self.frame, self.SHOT, player, position[0], position[1], rewind
+        )
+
+    def record_reload(self, player: int) -> None:
+        self.data += self.INPUT.pack(self.INPUT_TAG, self.frame, self.RELOAD, player, 0, 0, 0)
+
+    def update(self) -> None:
+        self.frame += 1
+        if self.frame % self.KEYFRAME_INTERVAL == 0:
+            self.add_keyframe()
+
+    def save(self, path: str) -> None:
+        with open(path, 'wb') as f:
+            f.write(self.data)
+            f.write(self.END.pack(self.END_TAG, self.frame))
+
+
+class Replay:
+    def __init__(
+        self,
+        session_id: int,
+        keyframes: list[tuple[int, bytes]],
+        inputs: dict[int, list[tuple]],
+        frame_count: int,
+    ) -> None:
+        self.session_id = session_id
+        self.keyframes = keyframes
+        self.keyframe_index = [frame for frame, _ in keyframes]
+        self.inputs = inputs
+        self.frame_count = frame_count
+
+    @classmethod
+    def load(cls, path: str) -> 'Replay':
+        with open(path, 'rb') as f:
+            data = f.read()
+        magic, version, session_id = ReplayRecorder.HEADER.unpack_from(data)
+        if magic != ReplayRecorder.MAGIC or version != ReplayRecorder.VERSION:
+            raise ValueError('not a replay: {}'.format(path))
+        keyframes = []
+        inputs: dict[int, list[tuple]] = {}
+        frame_count = 0
+        offset = ReplayRecorder.HEADER.size
+        while offset < len(data):
+            tag = data[offset]
+            if tag == ReplayRecorder.KEYFRAME_TAG:
+                _, frame, size = ReplayRecorder.KEYFRAME.unpack_from(data, offset)
+                offset += ReplayRecorder.KEYFRAME.size
+                keyframes.append((frame, data[offset : offset + size]))
+                offset += size
+            elif tag == ReplayRecorder.INPUT_TAG:
+                _, frame, *event = ReplayRecorder.INPUT.unpack_from(data, offset)
+                offset += ReplayRecorder.INPUT.size
+                inputs.setdefault(frame, []).append(tuple(event))
+            else:
+                _, frame_count = ReplayRecorder.END.unpack_from(data, offset)
+                break
+        else:
+            # unfinished session, playable up to its last keyframe or input
+            frame_count = max([frame for frame, _ in keyframes] + list(inputs))
+        return cls(session_id, keyframes, inputs, frame_count)
+
+    def step(self, world: GameWorld, frame: int) -> bool:
+        world.update_bullets()
+        for kind, player, x, y, rewind in self.inputs.get(frame, ()):
+            if kind == ReplayRecorder.SHOT:
+                world.fire(player, [x, y], rewind)
+            else:
+                world.reload(player)
+        return world.update_play()
+
+    def seek(self, frame: int, mediapipe_manager: MediapipeManager | None = None) -> GameWorld:
+        # the world as it was at the start of frame, detectors as of the keyframe before it
+        frame = max(0, min(frame, self.frame_count))
+        keyframe, snapshot = self.keyframes[bisect_right(self.keyframe_index, frame) - 1]
+        world = GameSnapshot.restore(snapshot, mediapipe_manager)
+        for step_frame in range(keyframe, frame):
+            self.step(world, step_frame)
+        return world
+
+
+class BinaryFileSink:
+    MAGIC = b'OBKL'
+    VERSION = 1
+    HEADER = struct.Struct('<4sHQ')
+    RECORD = struct.Struct('<IBBhhi')
+    MAX_FILE_SIZE = 16 * 1024 * 1024
+
+    def __init__(self, path: str, session_id: int) -> None:
+        self.path = path
+        self.size = 0
+        self.dropped = 0
+        with open(self.path, 'wb') as f:
+            f.write(self.HEADER.pack(self.MAGIC, self.VERSION, session_id))
+        self.size = self.HEADER.size
+
+    async def write(self, batch: list[tuple]) -> None:
+        size = self.RECORD.size * len(batch)
+        if self.size + size > self.MAX_FILE_SIZE:
+            self.dropped += len(batch)
+            return
+        data = b''.join(self.RECORD.pack(*event) for event in batch)
+        with open(self.path, 'ab') as f:
+            f.write(data)
+        self.size += size
+
+    @classmethod
+    def read(cls, path: str) -> tuple[int, list[tuple]]:
+        with open(path, 'rb') as f:
+            data = f.read()
+        magic, version, session_id = cls.HEADER.unpack_from(data)
+        if magic != cls.MAGIC or version != cls.VERSION:
+            raise ValueError('not an event log: {}'.format(path))
+        events = list(cls.RECORD.iter_unpack(data[cls.HEADER.size :]))
+        return session_id, events
+
+
+class JsonLinesSink:
+    MAX_FILE_SIZE = 64 * 1024 * 1024
+
+    def __init__(self, path: str, session_id: int) -> None:
+        self.path = path
+        self.session_id = session_id
+        self.size = 0
+        self.dropped = 0
+
+    async def write(self, batch: list[tuple]) -> None:
+        data = ''.join(
+            json.dumps(GameEventLog.to_dict(event, self.session_id)) + '\n'
+            for event in batch
+        )
+        if self.size + len(data) > self.MAX_FILE_SIZE:
+            self.dropped += len(batch)
+            return
+        with open(self.path, 'a') as f:
+            f.write(data)
+        self.size += len(data)
+
+
+class HttpSink:
+    TIMEOUT = 5
+
+    def __init__(self, url: str, session_id: int) -> None:
+        self.url = url
+        self.session_id = session_id
+        self.dropped = 0
+
+    async def write(self, batch: list[tuple]) -> None:
+        body = json.dumps(
+            {
+                'session': self.session_id,
+                'events': [GameEventLog.to_dict(event) for event in batch],
+            }
+        )
+        try:
+            if IS_BROWSER:
+                from pyodide.http import pyfetch
+
+                await pyfetch(
+                    self.url,
+                    method='POST',
+                    body=body,
+                    headers={'Content-Type': 'application/json'},
+                )
+            else:
+                await asyncio.to_thread(self.post, body)
+        except Exception:
+            self.dropped += len(batch)
+
+    def post(self, body: str) -> None:
+        import urllib.request
+
+        request = urllib.request.Request(
+            self.url,
+            data=body.encode(),
+            headers={'Content-Type': 'application/json'},
+            method='POST',
+        )
+        with urllib.request.urlopen(request, timeout=self.TIMEOUT) as response:
+            response.read()
+
+
+class GameEventLog:
+    EVENT_KINDS = ('session_start', 'shot', 'hit', 'reload', 'wave', 'session_end', 'seed')
+    EVENT_CODES = {kind: code for code, kind in enumerate(EVENT_KINDS)}
+
+    BUFFER_SIZE = 4096
+    BATCH_SIZE = 256
+    FLUSH_INTERVAL = 30
+    MAX_PENDING_FLUSHES = 2
+    # session_end carries ABORTED in x when the session was quit before its end
+    ABORTED = 1
+
+    executor = None
+
+    def __init__(self, session_id: int | None = None) -> None:
+        self.session_id = session_id if session_id is not None else time.time_ns()
+        self.sinks = []
+        self.buffer: deque[tuple] = deque(maxlen=self.BUFFER_SIZE)
+        self.frame = 0
+        self.dropped = 0
+        self.pending_flushes = []
+        self.closed = False
+
+    def add_sink(self, sink: Any) -> None:
+        self.sinks.append(sink)
+
+    def record(
+        self, kind: str, player: int = 0, x: float = 0, y: float = 0, value: int = 0
+    ) -> None:
+        if self.closed or len(self.buffer) == self.BUFFER_SIZE:
+            self.dropped += 1
+        if self.closed:
+            return
+        self.buffer.append(
+            (self.frame, self.EVENT_CODES[kind], player, int(x), int(y), value)
+        )
+
+    def update(self) -> None:
+        self.frame += 1
+        if self.frame % self.FLUSH_INTERVAL == 0:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self.sinks:
+            return
+        self.pending_flushes = [
+            future for future in self.pending_flushes if not future.done()
+        ]
+        while self.buffer and len(self.pending_flushes) < self.MAX_PENDING_FLUSHES:
+            self.pending_flushes.append(self.schedule(self.write(self.take_batch())))
+
+    def close(self, wait: bool = False) -> None:
+        # final flush, drains the whole buffer regardless of MAX_PENDING_FLUSHES;
+        # with wait the batches are written in this thread, e.g. at exit
+        if self.closed:
+            return
+        self.closed = True
+        if not self.sinks:
+            self.buffer.clear()
+            return
+        while self.buffer:
+            batch = self.take_batch()
+            if wait and not IS_BROWSER:
+                asyncio.run(self.write(batch))
+                continue
+            try:
+                self.pending_flushes.append(self.schedule(self.write(batch)))
+            except RuntimeError:
+                # the executor no longer takes work once the interpreter shuts down
+                self.dropped += len(batch)
+
+    def take_batch(self) -> list[tuple]:
+        batch_size = min(len(self.buffer), self.BATCH_SIZE)
+        return [self.buffer.popleft() for _ in range(batch_size)]
+
+    async def write(self, batch: list[tuple]) -> None:
+        for sink in self.sinks:
+            await sink.write(batch)
+
+    def schedule(self, coroutine: Any) -> Any:
+        if IS_BROWSER:
+            return asyncio.ensure_future(coroutine)
+        if GameEventLog.executor is None:
+            GameEventLog.executor = ThreadPoolExecutor(max_workers=1)
+        return GameEventLog.executor.submit(asyncio.run, coroutine)
+
     @classmethod
-    def update(cls):
-        if cls.count > 0:
-            cls.count -= 1
-        dx = random.randint(-cls.BREADTH, cls.BREADTH) * cls.count / cls.SHAKE_TIME
-        dy = random.randint(-cls.BREADTH, cls.BREADTH) * cls.count / cls.SHAKE_TIME
-        pyxel.camera(dx, dy)
+    def to_dict(cls, event: tuple, session_id: int | None = None) -> dict:
+        frame, code, player, x, y, value = event
+        data = {
+            'frame': frame,
+            'kind': cls.EVENT_KINDS[code],
+            'player': player,
+            'x': x,
+            'y': y,
+            'value': value,
+        }
+        if session_id is not None:
+            data['session'] = session_id
+        return data
+
+
+class VersusProtocol:
+    # message type, then LEB128 varints; state messages carry only what changed
+    # since the previous one, the relay forwards everything but JOIN verbatim
+    JOIN = 1
+    STATE = 2
+    FINISH = 3
+    LEAVE = 4
+
+    WAVE_FLAG = 1
+    SCORE_FLAG = 2
+    KILLS_FLAG = 4
+
+    MAX_KILLS = 255
+
+    @staticmethod
+    def pack_varint(value: int) -> bytes:
+        data = bytearray()
+        while value >= 0x80:
+            data.append(value & 0x7F | 0x80)
+            value >>= 7
+        data.append(value)
+        return bytes(data)
+
+    @staticmethod
+    def unpack_varint(data: bytes, offset: int) -> tuple[int, int]:
+        value = 0
+        shift = 0
+        while True:
+            byte = data[offset]
+            offset += 1
+            value |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                return value, offset
+            shift += 7
 
     @classmethod
-    def shake(cls):
-        cls.count = cls.SHAKE_TIME
+    def pack_signed(cls, value: int) -> bytes:
+        return cls.pack_varint(value * 2 if value >= 0 else -value * 2 - 1)
 
     @classmethod
-    def reset(cls):
-        cls.count = 0
-        pyxel.camera()
+    def unpack_signed(cls, data: bytes, offset: int) -> tuple[int, int]:
+        value, offset = cls.unpack_varint(data, offset)
+        return (value >> 1) ^ -(value & 1), offset
+
+    @classmethod
+    def join(cls, room: int, player_id: int) -> bytes:
+        return bytes([cls.JOIN]) + cls.pack_varint(room) + cls.pack_varint(player_id)
+
+    @classmethod
+    def parse_join(cls, data: bytes) -> tuple[int, int]:
+        room, offset = cls.unpack_varint(data, 1)
+        player_id, _ = cls.unpack_varint(data, offset)
+        return room, player_id
+
+    @classmethod
+    def state(
+        cls, wave_delta: int, score_delta: int, kills: list[tuple[int, int]]
+    ) -> bytes:
+        flags = (
+            (cls.WAVE_FLAG if wave_delta else 0)
+            | (cls.SCORE_FLAG if score_delta else 0)
+            | (cls.KILLS_FLAG if kills else 0)
+        )
+        data = bytearray([cls.STATE, flags])
+        if wave_delta:
+            data += cls.pack_signed(wave_delta)
+        if score_delta:
+            data += cls.pack_signed(score_delta)
+        if kills:
+            data.append(len(kills))
+            for x, y in kills:
+                data += bytes((x, y))
+        return bytes(data)
+
+    @classmethod
+    def parse_state(cls, data: bytes) -> tuple[int, int, list[tuple[int, int]]]:
+        flags = data[1]
+        offset = 2
+        wave_delta = score_delta = 0
+        kills = []
+        if flags & cls.WAVE_FLAG:
+            wave_delta, offset = cls.unpack_signed(data, offset)
+        if flags & cls.SCORE_FLAG:
+            score_delta, offset = cls.unpack_signed(data, offset)
+        if flags & cls.KILLS_FLAG:
+            kill_num = data[offset]
+            offset += 1
+            kills = [
+                (data[offset + 2 * i], data[offset + 2 * i + 1]) for i in range(kill_num)
+            ]
+        return wave_delta, score_delta, kills
+
+    @classmethod
+    def finish(cls, total: int) -> bytes:
+        return bytes([cls.FINISH]) + cls.pack_varint(total)
+
+
+class SocketTransport:
+    # non-blocking TCP with a 2 byte length before every message
+    HEADER = struct.Struct('<H')
+    RECEIVE_SIZE = 4096
+
+    executor = None
+
+    def __init__(self, host: str, port: int) -> None:
+        self.host = host
+        self.port = port
+        self.sock = None
+        self.resolving = None
+        self.outbox = bytearray()
+        self.inbox = bytearray()
+        self.closed = False
+
+    def connect(self) -> None:
+        # the host is resolved off the frame loop, messages wait in the outbox
+        if SocketTransport.executor is None:
+            SocketTransport.executor = ThreadPoolExecutor(max_workers=1)
+        self.resolving = SocketTransport.executor.submit(
+            socket.getaddrinfo, self.host, self.port, socket.AF_INET, socket.SOCK_STREAM
+        )
+
+    def poll_connect(self) -> bool:
+        # whether the socket has been created
+        if self.sock is not None:
+            return True
+        if self.closed or self.resolving is None or not self.resolving.done():
+            return False
+        try:
+            address = self.resolving.result()[0][4]
+        except OSError:
+            self.close()
+            return False
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setblocking(False)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        if self.sock.connect_ex(address) not in (0, errno.EINPROGRESS, errno.EWOULDBLOCK):
+            self.close()
+            return False
+        return True
+
+    def send(self, data: bytes) -> None:
+        self.outbox += self.HEADER.pack(len(data)) + data
+        self.flush()
+
+    def flush(self) -> None:
+        if self.closed or not self.poll_connect() or not self.outbox:
+            return
+        _, writable, _ = select.select([], [self.sock], [], 0)
+        if not writable:
+            return
+        try:
+            sent = self.sock.send(self.outbox)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            self.close()
+            return
+        del self.outbox[:sent]
+
+    def receive(self) -> list[bytes]:
+        self.flush()
+        while not self.closed and self.sock is not None:
+            try:
+                data = self.sock.recv(self.RECEIVE_SIZE)
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError:
+                self.close()
+                break
+            if not data:
+                self.close()
+                break
+            self.inbox += data
+        messages = []
+        while len(self.inbox) >= self.HEADER.size:
+            (size,) = self.HEADER.unpack_from(self.inbox)
+            if len(self.inbox) < self.HEADER.size + size:
+                break
+            messages.append(bytes(self.inbox[self.HEADER.size : self.HEADER.size + size]))
+            del self.inbox[: self.HEADER.size + size]
+        return messages
+
+    def is_closed(self) -> bool:
+        return self.closed
+
+    def close(self) -> None:
+        if self.sock is not None:
+            self.sock.close()
+        self.closed = True
+
+
+class WebSocketTransport:
+    # the socket lives in src/main.js, messages are queued there between frames
+    def __init__(self, url: str) -> None:
+        self.url = url
+
+    def connect(self) -> None:
+        js.versusConnect(self.url)
+
+    def send(self, data: bytes) -> None:
+        from pyodide.ffi import to_js
+
+        js.versusSend(to_js(data))
+
+    def receive(self) -> list[bytes]:
+        return [bytes(message.to_py()) for message in js.versusReceive()]
+
+    def is_closed(self) -> bool:
+        return bool(js.versusClosed())
+
+    def close(self) -> None:
+        js.versusClose()
+
+
+class GhostKill:
+    ACTIVE_TIME = 20
+    RADIUS = 12
+    COLOR = 12
+
+    def __init__(self, x: int, y: int) -> None:
+        self.x = x
+        self.y = y
+        self.count = 0
+        self.active = True
+
+    def _update(self) -> None:
+        self.count += 1
+        if self.count >= self.ACTIVE_TIME:
+            self.active = False
+
+    def _draw(self) -> None:
+        r = self.RADIUS * self.count // self.ACTIVE_TIME + 2
+        renderer.circb(self.x, self.y, r, self.COLOR)
+
+
+class VersusLink:
+    # score and wave sync with one opponent through relay.py
+    TICK_INTERVAL = FPS // 5
+    HEARTBEAT_INTERVAL = FPS * 2
+    TEXT_X = 10
+    TEXT_Y = 10
+    TEXT_COLOR = 12
+
+    def __init__(self, url: str, room: int, transport: Any = None) -> None:
+        self.room = room
+        # not from a seeded stream, two clients with one seed would collide
+        self.player_id = secrets.randbits(31)
+        if transport is None:
+            if IS_BROWSER:
+                transport = WebSocketTransport(url)
+            else:
+                host, _, port = url.split('://')[-1].partition(':')
+                transport = SocketTransport(host, int(port))
+        self.transport = transport
+        self.frame = 0
+        self.last_send_frame = 0
+        self.sent_wave = 0
+        self.sent_total = 0
+        self.kills: list[tuple[int, int]] = []
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.opponent_id = None
+        self.opponent_wave = 0
+        self.opponent_total = 0
+        self.opponent_finished = False
+        self.ghost_kill_list: list[GhostKill] = []
+
+    def start(self) -> None:
+        self.transport.connect()
+        self.send(VersusProtocol.join(self.room, self.player_id))
+
+    def send(self, data: bytes) -> None:
+        self.bytes_sent += len(data)
+        self.last_send_frame = self.frame
+        self.transport.send(data)
+
+    def record_kill(self, x: float, y: float) -> None:
+        if len(self.kills) < VersusProtocol.MAX_KILLS:
+            self.kills.append((max(0, min(int(x), 255)), max(0, min(int(y), 255))))
+
+    def update(self, wave_count: int, total: int) -> None:
+        self.frame += 1
+        self.receive()
+        for ghost_kill in self.ghost_kill_list:
+            ghost_kill._update()
+        self.ghost_kill_list = [
+            ghost_kill for ghost_kill in self.ghost_kill_list if ghost_kill.active
+        ]
+        if self.frame % self.TICK_INTERVAL:
+            return
+        wave_delta = wave_count - self.sent_wave
+        score_delta = total - self.sent_total
+        if (
+            wave_delta
+            or score_delta
+            or self.kills
+            or self.frame - self.last_send_frame >= self.HEARTBEAT_INTERVAL
+        ):
+            self.send(VersusProtocol.state(wave_delta, score_delta, self.kills))
+            self.sent_wave = wave_count
+            self.sent_total = total
+            self.kills = []
+
+    def receive(self) -> None:
+        for data in self.transport.receive():
+            self.bytes_received += len(data)
+            kind = data[0]
+            if kind == VersusProtocol.JOIN:
+                _, self.opponent_id = VersusProtocol.parse_join(data)
+            elif kind == VersusProtocol.STATE:
+                wave_delta, score_delta, kills = VersusProtocol.parse_state(data)
+                self.opponent_wave += wave_delta
+                self.opponent_total += score_delta
+                self.ghost_kill_list.extend(GhostKill(x, y) for x, y in kills)
+            elif kind == VersusProtocol.FINISH:
+                self.opponent_total, _ = VersusProtocol.unpack_varint(data, 1)
+                self.opponent_finished = True
+            elif kind == VersusProtocol.LEAVE:
+                self.opponent_id = None
+
+    def finish(self, total: int) -> None:
+        self.send(VersusProtocol.finish(total))
+
+    def is_connected(self) -> bool:
+        return not self.transport.is_closed()
+
+    def bandwidth(self) -> float:
+        # bytes per second sent, without transport framing
+        return self.bytes_sent * FPS / max(self.frame, 1)
+
+    def close(self) -> None:
+        self.transport.close()
+
+    def status_text(self) -> str:
+        if not self.is_connected():
+            return 'VS offline'
+        if self.opponent_id is None:
+            return 'VS waiting'
+        return 'VS {} W{}{}'.format(
+            self.opponent_total, self.opponent_wave, ' end' if self.opponent_finished else ''
+        )
+
+    def draw(self) -> None:
+        for ghost_kill in self.ghost_kill_list:
+            ghost_kill._draw()
+        renderer.text(self.TEXT_X, self.TEXT_Y, self.status_text(), self.TEXT_COLOR)
+
+
+class CameraSource:
+    # native counterpart of src/main.js: a thread reads the camera with OpenCV,
+    # runs the MediaPipe hand landmarker at the detection rate and hands the
+    # results over in the same form through on_results
+    MODEL_COMPLEXITY = 0
+    STOP_TIMEOUT = 1.0
+
+    def __init__(self, mediapipe_manager: MediapipeManager, camera: int) -> None:
+        self.mediapipe_manager = mediapipe_manager
+        self.camera = camera
+        self.running = False
+        self.thread = None
+
+    def start(self) -> None:
+        if self.thread is not None:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        # waits for the camera to be released
+        self.running = False
+        if self.thread is not None:
+            self.thread.join(self.STOP_TIMEOUT)
+
+    def run(self) -> None:
+        try:
+            import cv2
+            import mediapipe
+        except ImportError:
+            print('native hand tracking needs the opencv-python and mediapipe packages')
+            return
+        capture = cv2.VideoCapture(self.camera)
+        if not capture.isOpened():
+            print('camera {} could not be opened'.format(self.camera))
+            return
+        start_time = time.perf_counter()
+        last_detection_time = -math.inf
+        hand_num = 0
+        landmarker = None
+        try:
+            while self.running:
+                ok, frame = capture.read()
+                if not ok:
+                    break
+                video_height, video_width = frame.shape[:2]
+                if not self.mediapipe_manager.is_video_connect():
+                    self.mediapipe_manager.on_connect(video_width, video_height)
+                now = time.perf_counter()
+                detection_rate = self.mediapipe_manager.detection_rate
+                if detection_rate > 0 and now - last_detection_time < 1 / detection_rate:
+                    continue
+                last_detection_time = now
+                if hand_num != self.mediapipe_manager.hand_num():
+                    hand_num = self.mediapipe_manager.hand_num()
+                    if landmarker is not None:
+                        landmarker.close()
+                    landmarker = mediapipe.solutions.hands.Hands(
+                        max_num_hands=hand_num, model_complexity=self.MODEL_COMPLEXITY
+                    )
+                output = landmarker.process(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+                landmarks = [
+                    [{'x': point.x, 'y': point.y, 'z': point.z} for point in hand.landmark]
+                    for hand in output.multi_hand_landmarks or []
+                ]
+                self.mediapipe_manager.on_results(
+                    {
+                        'landmarks': landmarks,
+                        'region': None,
+                        'videoTime': now - start_time,
+                        'inferenceTime': (time.perf_counter() - now) * 1000,
+                        'videoWidth': video_width,
+                        'videoHeight': video_height,
+                    }
+                )
+        finally:
+            if landmarker is not None:
+                landmarker.close()
+            capture.release()
+
+
+class ResultReceiver:
+    def __init__(self, mediapipe_manager: MediapipeManager, camera: int | None = None) -> None:
+        self.mediapipe_manager = mediapipe_manager
+        self.camera = camera
+        self.task = None
+        self.camera_source = None
+
+    def start(self) -> None:
+        if js is None:
+            # natively there is no src/main.js, the camera is read on a thread
+            if self.camera_source is None and self.camera is not None:
+                self.camera_source = CameraSource(self.mediapipe_manager, self.camera)
+                self.camera_source.start()
+            return
+        if self.task is None:
+            self.task = asyncio.ensure_future(self.receive())
+
+    def close(self) -> None:
+        if self.camera_source is not None:
+            self.camera_source.stop()
+
+    async def receive(self) -> None:
+        video = (await js.waitConnected()).to_py()
+        self.mediapipe_manager.on_connect(video['videoWidth'], video['videoHeight'])
+        while True:
+            results = await js.nextResults()
+            self.mediapipe_manager.on_results(results.to_py())
 
 
 class App:
     INIT_SENS = 0.5
+    INIT_PLAYER_NUM = 1
+    EVENT_LOG_BINARY_PATH = None
+    EVENT_LOG_JSONL_PATH = None
+    EVENT_LOG_URL = None
+    REPLAY_PATH = None
+    # camera index for native hand tracking, None to disable it
+    CAMERA = 0
+    # shared memory name of the landmark stream for landmark_reader.py, native only
+    EXPORT_NAME = None
+    # e.g. 'tcp://127.0.0.1:8765' natively or 'ws://127.0.0.1:8765' in the browser
+    VERSUS_URL = None
+    VERSUS_ROOM = 1
+    PREFETCH = True
+    PREFETCH_IDLE_FRAMES = 10
+    PROFILE = False
+    SEED = None
+    ENDLESS = False
+    # skip title/result frames identical to the previous one
+    SKIP_IDLE_FRAMES = True
+    # (detections per second, while the hands are still) for each scene
+    DETECTION_RATES = {
+        'title': (15, 5),
+        'play': (30, 15),
+        'result': (10, 3),
+    }
 
     def __init__(self) -> None:
-        pyxel.init(WINDOW_W, WINDOW_H, title='obakeHunt')
+        pyxel.init(WINDOW_W, WINDOW_H, title='obakeHunt', fps=FPS)
         pyxel.mouse(True)
-        self.mediapipe_manager = MediapipeManager(self.INIT_SENS)
-        self.obake_list = []
-        self.bullet_manger = BulletManager()
-        Score.load()
-        ObakeDeadParticle.load()
-        ObakeParticle.load()
-        self.wave = Wave()
-        self.title_menu = TitleMenu(self.INIT_SENS)
+        self.profiler = FrameProfiler()
+        if self.PROFILE:
+            self.profiler.enable()
+        self.gc_scheduler = GCScheduler()
+        self.power_manager = PowerManager()
+        self.frame_tracker = None
+        if self.SKIP_IDLE_FRAMES:
+            self.frame_tracker = ChangeTrackingRenderer(renderer)
+            set_renderer(self.frame_tracker)
+        self.mediapipe_manager = MediapipeManager(self.INIT_SENS, self.INIT_PLAYER_NUM)
+        if self.EXPORT_NAME and not IS_BROWSER:
+            self.mediapipe_manager.exporter = LandmarkExporter(self.EXPORT_NAME)
+        self.result_receiver = ResultReceiver(self.mediapipe_manager, self.CAMERA)
+        atexit.register(self.result_receiver.close)
+        self.world = GameWorld(self.INIT_PLAYER_NUM, self.SEED, self.ENDLESS)
+        self.title_menu = TitleMenu(self.INIT_SENS, self.INIT_PLAYER_NUM)
         self.result = Result()
         self.status = 'title'
+        self.idle_count = 0
+        self.prefetch_queue = deque(
+            [
+                BackGround.load,
+                Obake.load,
+                ShootDetector.load,
+                BulletUI.load,
+                ReloadUI.load,
+                ScoreManager.load,
+                ObakeDeadParticleManager.load,
+                self.result.load,
+                ObakeParticleManager.load,
+            ]
+        )
+        self.event_log = GameEventLog()
+        atexit.register(self.close_event_log)
+        self.replay_recorder = None
+        self.versus = None
+        self.first_frame_time = None
+        self.result_receiver.start()
         pyxel.run(self.update, self.draw)
 
+    def prefetch(self) -> None:
+        if not self.PREFETCH or not self.prefetch_queue:
+            return
+        if self.mediapipe_manager.is_pointing():
+            self.idle_count = 0
+            return
+        self.idle_count += 1
+        if self.idle_count > self.PREFETCH_IDLE_FRAMES:
+            self.prefetch_queue.popleft()()
+
+    def report_first_frame(self) -> None:
+        self.first_frame_time = time.perf_counter() - BOOT_TIME
+        if js is None:
+            print('time to first frame: {:.3f}s'.format(self.first_frame_time))
+            return
+        page_time = js.performance.now() / 1000
+        print(
+            'time to first frame: {:.3f}s (script), {:.3f}s (page)'.format(
+                self.first_frame_time, page_time
+            )
+        )
+
     def update(self) -> None:
-        if not self.mediapipe_manager.is_video_connect():
-            self.mediapipe_manager.connect()
+        connected = self.mediapipe_manager.is_video_connect()
+        if connected:
+            # results are ingested on every frame, so a hand wakes low power at once
+            with self.profiler.section('mediapipe'):
+                self.mediapipe_manager.update()
+        active = self.status == 'play' or self.mediapipe_manager.is_detect()
+        if not self.power_manager.update(active):
+            return
+        if not self.power_manager.low_power:
+            QualityGovernor.update(self.mediapipe_manager.detection_interval())
+        idle = self.status != 'play' and not self.mediapipe_manager.is_pointing()
+        self.gc_scheduler.update(idle)
+        if not connected:
+            self.prefetch()
             return
 
-        self.mediapipe_manager.update()
+        with self.profiler.section('mediapipe'):
+            if self.power_manager.low_power:
+                rate = self.power_manager.LOW_POWER_DETECTION_RATE
+                self.mediapipe_manager.update_detection_rate(rate, rate)
+            else:
+                detection_rate, stable_rate = self.DETECTION_RATES[self.status]
+                self.mediapipe_manager.update_detection_rate(
+                    detection_rate, stable_rate, aim_stable=self.status != 'play'
+                )
 
         if self.status == 'title':
+            self.prefetch()
             self.title_menu.update()
             if pyxel.btnr(pyxel.MOUSE_BUTTON_LEFT):
                 if self.title_menu.select(pyxel.mouse_x, pyxel.mouse_y):
-                    self.status = 'play'
-            point = self.mediapipe_manager.point_detector.selected_point()
+                    self.start()
+            point = self.mediapipe_manager.selected_point()
             if point:
                 if self.title_menu.select(point[0], point[1]):
-                    self.status = 'play'
+                    self.start()
             self.mediapipe_manager.sens = self.title_menu.sens
+            self.mediapipe_manager.set_hand_num(self.title_menu.player_num)
 
         if self.status == 'play':
             if pyxel.btn(pyxel.KEY_R):
+                self.end_session(aborted=True)
                 self.reset()
                 self.status = 'title'
                 return
 
-            self.bullet_manger.update()
-
-            if self.mediapipe_manager.shoot_detector.is_shoot():
-                if self.bullet_manger.shoot():
-                    for obake in self.obake_list:
-                        obake.shot(
-                            self.mediapipe_manager.shoot_detector.shoot_position()
-                        )
-                    ShakeEffect.shake()
-            if self.mediapipe_manager.reload_detector.is_reload():
-                self.bullet_manger.reload()
-
-            for obake in self.obake_list:
-                obake.update()
-
-            self.obake_list = [obake for obake in self.obake_list if obake.is_active()]
-            if len(self.obake_list) == 0:
-                obake_list = self.wave.spawn()
-                if obake_list:
-                    self.obake_list.extend(obake_list)
-                else:
-                    self.status = 'result'
+            with self.profiler.section('input'):
+                self.world.update_bullets()
+                self.update_players()
+
+            with self.profiler.section('world'):
+                wave_count = self.world.wave.wave_count
+                running = self.world.update_play()
+                if self.world.wave.wave_count != wave_count:
+                    self.event_log.record('wave', value=self.world.wave.wave_count)
+                    self.gc_scheduler.checkpoint()
+
+            with self.profiler.section('event_log'):
+                self.event_log.update()
+                if self.replay_recorder is not None:
+                    self.replay_recorder.update()
+
+            if self.versus is not None:
+                with self.profiler.section('versus'):
+                    self.versus.update(
+                        self.world.wave.wave_count, self.world.score_manager.total
+                    )
 
-            Score.update()
-            ObakeDeadParticle.update()
-            ShakeEffect.update()
+            if not running:
+                self.finish()
 
         if self.status == 'result':
-            ObakeParticle.update()
+            self.world.update_result(QualityGovernor.setting('particle_interval'))
             self.result.update()
+            if self.versus is not None:
+                self.versus.update(self.world.wave.wave_count, self.world.score_manager.total)
             if pyxel.btnr(pyxel.MOUSE_BUTTON_LEFT):
                 if self.result.select(pyxel.mouse_x, pyxel.mouse_y):
                     self.reset()
                     self.status = 'title'
-            point = self.mediapipe_manager.point_detector.selected_point()
+            point = self.mediapipe_manager.selected_point()
             if point:
                 if self.result.select(point[0], point[1]):
                     self.reset()
                     self.status = 'title'
 
+    def update_players(self) -> None:
+        for player, track in enumerate(self.mediapipe_manager.tracks):
+            if track.shoot_detector.is_shoot():
+                position = track.shoot_detector.shoot_position()
+                rewind = self.mediapipe_manager.rewind_frames(track.shoot_detector)
+                if self.replay_recorder is not None:
+                    self.replay_recorder.record_shot(player, position, rewind)
+                hit_list = self.world.fire(player, position, rewind)
+                if hit_list is not None:
+                    self.event_log.record(
+                        'shot', player, position[0] * WINDOW_W, position[1] * WINDOW_H
+                    )
+                    for obake in hit_list:
+                        self.event_log.record('hit', player, obake.x, obake.y, Obake.SCORE)
+                        if self.versus is not None:
+                            self.versus.record_kill(obake.x + Obake.W / 2, obake.y + Obake.H / 2)
+            if track.reload_detector.is_reload():
+                if self.replay_recorder is not None:
+                    self.replay_recorder.record_reload(player)
+                if self.world.reload(player):
+                    self.event_log.record('reload', player)
+
+    def start(self) -> None:
+        player_num = self.title_menu.player_num
+        self.mediapipe_manager.set_hand_num(player_num)
+        self.world = GameWorld(player_num, self.SEED, self.ENDLESS)
+        self.event_log.close()
+        self.event_log = self.create_event_log()
+        self.event_log.record('session_start', value=player_num)
+        self.event_log.record('seed', value=self.world.seed)
+        if self.VERSUS_URL:
+            if self.versus is not None:
+                self.versus.close()
+            self.versus = VersusLink(self.VERSUS_URL, self.VERSUS_ROOM)
+            self.versus.start()
+        if self.REPLAY_PATH:
+            self.replay_recorder = ReplayRecorder(
+                self.world, self.mediapipe_manager, self.event_log.session_id
+            )
+        self.status = 'play'
+        self.gc_scheduler.suspend()
+
+    def end_session(self, aborted: bool = False, wait: bool = False) -> None:
+        x = GameEventLog.ABORTED if aborted else 0
+        for player, total in enumerate(self.world.score_manager.player_total):
+            self.event_log.record('session_end', player, x, value=total)
+        self.event_log.close(wait)
+
+    def finish(self) -> None:
+        self.end_session()
+        if self.replay_recorder is not None:
+            self.replay_recorder.save(self.REPLAY_PATH.format(self.event_log.session_id))
+            self.replay_recorder = None
+        if self.versus is not None:
+            self.versus.finish(self.world.score_manager.total)
+        self.status = 'result'
+        self.gc_scheduler.resume()
+
+    def close_event_log(self) -> None:
+        if self.status == 'play':
+            self.end_session(aborted=True, wait=True)
+        else:
+            self.event_log.close(wait=True)
+
+    def create_event_log(self) -> GameEventLog:
+        event_log = GameEventLog()
+        session_id = event_log.session_id
+        if self.EVENT_LOG_BINARY_PATH:
+            path = self.EVENT_LOG_BINARY_PATH.format(session_id)
+            event_log.add_sink(BinaryFileSink(path, session_id))
+        if self.EVENT_LOG_JSONL_PATH:
+            path = self.EVENT_LOG_JSONL_PATH.format(session_id)
+            event_log.add_sink(JsonLinesSink(path, session_id))
+        if self.EVENT_LOG_URL:
+            event_log.add_sink(HttpSink(self.EVENT_LOG_URL, session_id))
+        return event_log
+
     def reset(self) -> None:
-        self.obake_list = []
-        ObakeDeadParticle.reset()
-        ObakeParticle.reset()
-        self.bullet_manger.reset()
-        self.wave.reset()
-        Score.reset()
-        ShakeEffect.reset()
+        self.world.reset()
+        self.replay_recorder = None
+        if self.versus is not None:
+            self.versus.close()
+            self.versus = None
+        self.gc_scheduler.resume()
 
     def draw(self) -> None:
-        pyxel.cls(0)
+        if self.frame_tracker is not None:
+            self.frame_tracker.enabled = self.status != 'play'
+            # the mouse cursor is not part of the recorded commands
+            if self.power_manager.mouse_active:
+                self.frame_tracker.invalidate()
+        with self.profiler.section('draw'):
+            self.draw_scene()
+        self.profiler.end_frame()
+        if self.first_frame_time is None:
+            self.report_first_frame()
+
+    def draw_scene(self) -> None:
+        renderer.begin_frame()
+        renderer.cls(0)
         if self.status == 'title':
             if self.mediapipe_manager.is_video_connect():
-                videoWidth = js.videoWidth
-                videoHeight = js.videoHeight
-                pyxel.text(
+                renderer.text(
                     WINDOW_W // 4,
                     WINDOW_H - 10,
-                    'CAMERA {}x{}'.format(videoWidth, videoHeight),
+                    'CAMERA {}x{}'.format(
+                        self.mediapipe_manager.video_width,
+                        self.mediapipe_manager.video_height,
+                    ),
                     7,
                 )
                 if self.mediapipe_manager.is_detect():
-                    pyxel.text(WINDOW_W // 2 + 10, WINDOW_H - 10, 'HAND: found', 7)
+                    renderer.text(WINDOW_W // 2 + 10, WINDOW_H - 10, 'HAND: found', 7)
                 else:
-                    pyxel.text(WINDOW_W // 2 + 10, WINDOW_H - 10, 'HAND: not found', 7)
+                    renderer.text(WINDOW_W // 2 + 10, WINDOW_H - 10, 'HAND: not found', 7)
             else:
-                pyxel.text(
+                renderer.text(
                     WINDOW_W // 4, WINDOW_H - 10, 'Waiting for camera to connect', 7
                 )
             self.title_menu.draw()
             self.mediapipe_manager.draw()
-            self.mediapipe_manager.point_detector.draw()
+            self.mediapipe_manager.draw_pointer()
         if self.status == 'play':
+            if QualityGovernor.setting('shake'):
+                renderer.camera(*self.world.camera_offset())
             BackGround.draw()
             self.mediapipe_manager.draw()
-            for obake in self.obake_list:
-                obake.draw()
-            self.mediapipe_manager.shoot_detector.draw()
-            self.bullet_manger.draw()
-            Score.draw()
-            ObakeDeadParticle.draw()
+            self.world.draw_obake(QualityGovernor.setting('appear_fade'))
+            self.mediapipe_manager.draw_mark()
+            self.world.draw_ui(QualityGovernor.setting('dead_fade'))
+            if self.versus is not None:
+                self.versus.draw()
+            renderer.camera()
         if self.status == 'result':
-            ObakeParticle.draw()
-            self.result.draw()
+            self.world.draw_result()
+            self.result.draw(self.world.score_manager)
+            if self.versus is not None:
+                self.versus.draw()
             self.mediapipe_manager.draw()
-            self.mediapipe_manager.point_detector.draw()
+            self.mediapipe_manager.draw_pointer()
+        renderer.end_frame()
+
+
+def main() -> None:
+    App()
 
 
-App()
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,187 @@
+"""Relay server for the networked versus mode.
+
+Pairs game instances by the room of their first (JOIN) message and
+forwards every later message to the other player of the room. Browsers
+connect over WebSocket, native clients over plain TCP with a 2 byte
+length before every message; both can share a room. Meant to run locally
+or next to the page, e.g.
+
+    python relay.py --port 8765 --stats
+"""
+
+import argparse
+import asyncio
+import base64
+import hashlib
+import struct
+import sys
+import time
+
+from main import SocketTransport, VersusProtocol
+
+ROOM_SIZE = 2
+MAX_MESSAGE_SIZE = 4096
+STATS_INTERVAL = 10
+WEBSOCKET_GUID = b'258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+
+
+class Connection:
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.reader = reader
+        self.writer = writer
+        self.websocket = False
+        self.pending = b''
+        self.join = b''
+        self.bytes_received = 0
+        self.start_time = time.monotonic()
+
+    async def open(self) -> None:
+        first = await self.reader.readexactly(4)
+        if first != b'GET ':
+            self.pending = first
+            return
+        request = first + await self.reader.readuntil(b'\r\n\r\n')
+        key = b''
+        for line in request.split(b'\r\n'):
+            name, _, value = line.partition(b':')
+            if name.strip().lower() == b'sec-websocket-key':
+                key = value.strip()
+        accept = base64.b64encode(hashlib.sha1(key + WEBSOCKET_GUID).digest())
+        self.writer.write(
+            b'HTTP/1.1 101 Switching Protocols\r\n'
+            b'Upgrade: websocket\r\n'
+            b'Connection: Upgrade\r\n'
+            b'Sec-WebSocket-Accept: ' + accept + b'\r\n\r\n'
+        )
+        self.websocket = True
+
+    async def read_exactly(self, size: int) -> bytes:
+        data = self.pending[:size]
+        self.pending = self.pending[size:]
+        if len(data) < size:
+            data += await self.reader.readexactly(size - len(data))
+        return data
+
+    async def receive(self) -> bytes | None:
+        if not self.websocket:
+            (size,) = SocketTransport.HEADER.unpack(
+                await self.read_exactly(SocketTransport.HEADER.size)
+            )
+            data = await self.read_exactly(size)
+            self.bytes_received += SocketTransport.HEADER.size + size
+            return data
+        while True:
+            head, length = await self.read_exactly(2)
+            opcode = head & 0x0F
+            size = length & 0x7F
+            if size == 126:
+                (size,) = struct.unpack('>H', await self.read_exactly(2))
+            elif size == 127:
+                (size,) = struct.unpack('>Q', await self.read_exactly(8))
+            if size > MAX_MESSAGE_SIZE:
+                return None
+            mask = await self.read_exactly(4) if length & 0x80 else bytes(4)
+            payload = bytes(b ^ mask[i % 4] for i, b in enumerate(await self.read_exactly(size)))
+            self.bytes_received += size + 2
+            if opcode == 0x8:
+                return None
+            if opcode == 0x9:
+                self.write_frame(0xA, payload)
+            elif opcode == 0x2:
+                return payload
+
+    def write_frame(self, opcode: int, payload: bytes) -> None:
+        size = len(payload)
+        if size < 126:
+            header = bytes((0x80 | opcode, size))
+        else:
+            header = bytes((0x80 | opcode, 126)) + struct.pack('>H', size)
+        self.writer.write(header + payload)
+
+    def send(self, data: bytes) -> None:
+        if self.websocket:
+            self.write_frame(0x2, data)
+        else:
+            self.writer.write(SocketTransport.HEADER.pack(len(data)) + data)
+
+    def bandwidth(self) -> float:
+        return self.bytes_received / max(time.monotonic() - self.start_time, 1e-3)
+
+
+class Relay:
+    def __init__(self, stats: bool = False) -> None:
+        self.rooms: dict[int, list[Connection]] = {}
+        self.stats = stats
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        connection = Connection(reader, writer)
+        room = None
+        try:
+            await connection.open()
+            join = await connection.receive()
+            if not join or join[0] != VersusProtocol.JOIN:
+                return
+            room, _ = VersusProtocol.parse_join(join)
+            members = self.rooms.setdefault(room, [])
+            if len(members) >= ROOM_SIZE:
+                room = None
+                return
+            connection.join = join
+            for member in members:
+                member.send(join)
+                connection.send(member.join)
+            members.append(connection)
+            while True:
+                data = await connection.receive()
+                if data is None:
+                    break
+                for member in self.rooms[room]:
+                    if member is not connection:
+                        member.send(data)
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            pass
+        finally:
+            if room is not None:
+                members = self.rooms[room]
+                members.remove(connection)
+                for member in members:
+                    member.send(bytes([VersusProtocol.LEAVE]))
+                if not members:
+                    del self.rooms[room]
+            writer.close()
+
+    async def report(self) -> None:
+        while True:
+            await asyncio.sleep(STATS_INTERVAL)
+            for room, members in self.rooms.items():
+                print(
+                    'room {}: {}'.format(
+                        room,
+                        ', '.join('{:.0f} B/s'.format(member.bandwidth()) for member in members),
+                    )
+                )
+
+    async def serve(self, host: str, port: int) -> None:
+        server = await asyncio.start_server(self.handle, host, port)
+        print('relay listening on {}:{}'.format(host, port))
+        if self.stats:
+            asyncio.ensure_future(self.report())
+        async with server:
+            await server.serve_forever()
+
+
+def main_cli(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--stats', action='store_true', help='print bandwidth per player')
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(Relay(args.stats).serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main_cli(sys.argv[1:]))
@@ -0,0 +1,123 @@
+"""Headless render check for the title, play and result frames.
+
+Draws each frame through the recording renderer, rasterizes the recorded
+commands with the software renderer and prints the draw-call count and a
+framebuffer hash per frame. With --golden DIR the framebuffers are
+compared against DIR/<frame>.npy (or written there with --update).
+
+    python render_check.py --golden goldens --update
+    python render_check.py --golden goldens
+"""
+
+import argparse
+import hashlib
+import os
+import sys
+
+import numpy as np
+
+import main
+
+SEED = 0
+
+
+def draw_title() -> None:
+    mediapipe_manager = main.MediapipeManager(main.App.INIT_SENS)
+    main.TitleMenu(main.App.INIT_SENS).draw()
+    mediapipe_manager.draw()
+    mediapipe_manager.draw_pointer()
+
+
+def draw_play() -> None:
+    world = main.GameWorld(seed=SEED)
+    world.spawn()
+    for _ in range(main.Obake.APPEAR_TIME * 2):
+        world.update_obake()
+    obake = world.obake_list[0]
+    world.shoot(
+        [
+            (obake.x + main.Obake.W / 2) / main.WINDOW_W,
+            (obake.y + main.Obake.H / 2) / main.WINDOW_H,
+        ]
+    )
+    world.bullet_managers[0].shoot()
+    mediapipe_manager = main.MediapipeManager(main.App.INIT_SENS)
+
+    main.BackGround.draw()
+    mediapipe_manager.draw()
+    world.draw_obake()
+    mediapipe_manager.draw_mark()
+    world.draw_ui()
+
+
+def draw_result() -> None:
+    world = main.GameWorld(seed=SEED)
+    world.score_manager.add_score(0, 0, 30000)
+    for _ in range(main.ObakeParticleManager.INTERVAL * 40):
+        world.update_result()
+    world.draw_result()
+    main.Result().draw(world.score_manager)
+
+
+FRAMES = {
+    'title': draw_title,
+    'play': draw_play,
+    'result': draw_result,
+}
+
+
+def render(draw) -> tuple[list[tuple], int, np.ndarray]:
+    recorder = main.RecordingRenderer()
+    main.set_renderer(recorder)
+    try:
+        recorder.begin_frame()
+        recorder.cls(0)
+        draw()
+        recorder.camera()
+        recorder.end_frame()
+    finally:
+        main.set_renderer(main.PyxelRenderer())
+    commands = recorder.last_frame()
+    framebuffer = main.SoftwareRenderer().replay(commands)
+    return commands, recorder.draw_count(), framebuffer.copy()
+
+
+def main_cli(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--golden', help='directory holding golden framebuffers')
+    parser.add_argument('--update', action='store_true', help='rewrite the goldens')
+    args = parser.parse_args(argv)
+
+    failed = []
+    for name, draw in FRAMES.items():
+        commands, draw_count, framebuffer = render(draw)
+        digest = hashlib.sha1(framebuffer.tobytes()).hexdigest()[:12]
+        status = ''
+        if args.golden:
+            path = os.path.join(args.golden, name + '.npy')
+            if args.update:
+                os.makedirs(args.golden, exist_ok=True)
+                np.save(path, framebuffer)
+                status = 'updated'
+            elif not os.path.exists(path):
+                failed.append(name)
+                status = 'missing golden'
+            else:
+                diff = np.count_nonzero(np.load(path) != framebuffer)
+                status = 'ok' if diff == 0 else '{} pixels differ'.format(diff)
+                if diff:
+                    failed.append(name)
+        print(
+            '{:8} draw calls {:4}  commands {:4}  {}  {}'.format(
+                name,
+                draw_count,
+                len(commands),
+                digest,
+                status,
+            )
+        )
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main_cli(sys.argv[1:]))
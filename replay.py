@@ -0,0 +1,91 @@
+"""Seek into a recorded play session.
+
+Restores the keyframe of a replay written with App.REPLAY_PATH nearest to
+the requested frame, re-simulates the frames after it and prints the state
+reached, e.g.
+
+    python replay.py replay_123.obkr --frame 54000 --snapshot late.obks
+    python replay.py replay_123.obkr --frame 54000 --profile 300
+    python replay.py replay_123.obkr --verify
+"""
+
+import argparse
+import sys
+import time
+
+import main
+
+
+def describe(world: main.GameWorld) -> str:
+    return 'wave {} obake {} score {} bullets {}'.format(
+        world.wave.wave_count,
+        len(world.obake_list),
+        world.score_manager.total,
+        [bullet_manager.bullet_num for bullet_manager in world.bullet_managers],
+    )
+
+
+def verify(replay: main.Replay) -> int:
+    # re-simulate the whole session from the first keyframe and compare each later one
+    world = replay.seek(0)
+    frame = 0
+    mismatches = 0
+    for keyframe, snapshot in replay.keyframes[1:]:
+        while frame < keyframe:
+            replay.step(world, frame)
+            frame += 1
+        expected = main.GameSnapshot.restore(snapshot)
+        if main.GameSnapshot.capture(world) != main.GameSnapshot.capture(expected):
+            mismatches += 1
+            print(
+                'keyframe {} differs: {} != {}'.format(
+                    keyframe, describe(world), describe(expected)
+                )
+            )
+    print('{} keyframes, {} mismatches'.format(len(replay.keyframes), mismatches))
+    return 1 if mismatches else 0
+
+
+def main_cli(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('path', help='replay file')
+    parser.add_argument('--frame', type=int, default=None, help='frame to seek to, default last')
+    parser.add_argument('--snapshot', help='write the reached state as a game snapshot')
+    parser.add_argument('--profile', type=int, default=0, help='profile N frames after seeking')
+    parser.add_argument('--verify', action='store_true', help='check keyframes re-simulate')
+    args = parser.parse_args(argv)
+
+    replay = main.Replay.load(args.path)
+    print(
+        'session {}: {} frames, {} keyframes'.format(
+            replay.session_id, replay.frame_count, len(replay.keyframes)
+        )
+    )
+    if args.verify:
+        return verify(replay)
+
+    frame = replay.frame_count if args.frame is None else args.frame
+    start = time.perf_counter()
+    world = replay.seek(frame)
+    print(
+        'frame {}: {} ({:.1f}ms)'.format(
+            frame, describe(world), (time.perf_counter() - start) * 1000
+        )
+    )
+    if args.snapshot:
+        with open(args.snapshot, 'wb') as f:
+            f.write(main.GameSnapshot.capture(world))
+
+    if args.profile:
+        profiler = main.FrameProfiler(args.profile)
+        profiler.enable()
+        for step_frame in range(frame, frame + args.profile):
+            with profiler.section('world'):
+                replay.step(world, step_frame)
+            profiler.end_frame()
+        profiler.disable()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main_cli(sys.argv[1:]))
@@ -0,0 +1,246 @@
+"""Headless batch simulator for wave balancing.
+
+Runs many full sessions of the play scene with a bot player across a
+process pool and prints score, kill rate and ammo starvation statistics
+for every configuration of a parameter grid, e.g.
+
+    python simulator.py --sessions 200 \\
+        --param Wave.SPAWN_DELAY=90,120 --param BulletManager.RELOAD_TIME=45,60
+"""
+
+import argparse
+from dataclasses import asdict, dataclass
+import itertools
+import json
+from multiprocessing import Pool
+import os
+import random
+import statistics
+import sys
+from typing import Any
+
+import main
+
+FPS = 30
+MAX_SESSION_FRAMES = FPS * 60 * 10
+
+
+@dataclass
+class BotParams:
+    aim_error: float = 6.0
+    reaction_delay: int = 8
+    flick_delay: int = 6
+    reload_delay: int = 10
+
+
+@dataclass
+class SessionStats:
+    score: int = 0
+    spawned: int = 0
+    kills: int = 0
+    shots: int = 0
+    frames: int = 0
+    starved_frames: int = 0
+
+    @property
+    def kill_rate(self) -> float:
+        return self.kills / self.spawned if self.spawned else 0
+
+    @property
+    def starvation(self) -> float:
+        return self.starved_frames / self.frames if self.frames else 0
+
+
+class BotPlayer:
+    def __init__(self, params: BotParams, rng: random.Random) -> None:
+        self.params = params
+        self.rng = rng
+        # read per session, after a parameter grid entry has been applied
+        self.hold_frames = int(main.ShootDetector.MARK_DETECTION_TIME * FPS)
+        self.reload_wanted = False
+        self.target: main.Obake | None = None
+        self.wait = 0
+        self.mark: list[float] | None = None
+        self.shot_frame = -1
+
+    def update(
+        self,
+        frame: int,
+        obake_list: list[main.Obake],
+        bullet_manager: main.BulletManager,
+        stats: SessionStats,
+    ) -> list[float] | None:
+        self.reload_wanted = False
+        shootable = [obake for obake in obake_list if self.is_shootable(obake)]
+        if bullet_manager.is_out_of_ammo() or bullet_manager.is_reloading():
+            if shootable:
+                stats.starved_frames += 1
+            self.target = None
+            self.mark = None
+            self.wait += 1
+            self.reload_wanted = self.wait > self.params.reload_delay
+            return None
+
+        if self.mark is not None:
+            if frame >= self.shot_frame:
+                position = self.mark
+                self.mark = None
+                self.target = None
+                self.wait = 0
+                return position
+            return None
+
+        if self.target is None or not self.is_shootable(self.target):
+            self.target = shootable[0] if shootable else None
+            self.wait = 0
+            return None
+
+        self.wait += 1
+        if self.wait < self.params.reaction_delay + self.hold_frames:
+            return None
+        x = self.target.x + main.Obake.W / 2 + self.rng.gauss(0, self.params.aim_error)
+        y = self.target.y + main.Obake.H / 2 + self.rng.gauss(0, self.params.aim_error)
+        self.mark = [x / main.WINDOW_W, y / main.WINDOW_H]
+        self.shot_frame = frame + self.params.flick_delay
+        return None
+
+    @staticmethod
+    def is_shootable(obake: main.Obake) -> bool:
+        return obake.is_active() and not obake.is_waiting() and not obake.is_appearing()
+
+
+def apply_params(params: dict[str, Any]) -> dict[str, Any]:
+    defaults = {}
+    for name, value in params.items():
+        cls_name, attr = name.split('.')
+        cls = getattr(main, cls_name)
+        defaults[name] = getattr(cls, attr)
+        setattr(cls, attr, value)
+    return defaults
+
+
+def simulate_session(bot_params: BotParams, seed: int) -> SessionStats:
+    world = main.GameWorld(seed=seed)
+    bot = BotPlayer(bot_params, world.random.stream('bot'))
+    stats = SessionStats()
+
+    # the same step order as App.update in the play scene
+    for frame in range(MAX_SESSION_FRAMES):
+        world.update_bullets()
+        position = bot.update(frame, world.obake_list, world.bullet_managers[0], stats)
+        if bot.reload_wanted:
+            world.reload(0)
+        if position is not None:
+            hit_list = world.fire(0, position, bot_params.flick_delay)
+            if hit_list is not None:
+                stats.shots += 1
+                stats.kills += len(hit_list)
+        running = world.update_play()
+        stats.frames = frame + 1
+        if not running:
+            break
+
+    stats.score = world.score_manager.total
+    stats.spawned = world.wave.spawn_count
+    return stats
+
+
+def run_task(task: tuple[int, dict[str, Any], BotParams, int]) -> tuple[int, SessionStats]:
+    config_index, params, bot_params, seed = task
+    defaults = apply_params(params)
+    try:
+        return config_index, simulate_session(bot_params, seed)
+    finally:
+        apply_params(defaults)
+
+
+def parse_value(text: str) -> Any:
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        return text
+
+
+def parse_grid(param_args: list[str]) -> list[dict[str, Any]]:
+    names = []
+    values = []
+    for arg in param_args:
+        name, _, choices = arg.partition('=')
+        separator = ';' if ';' in choices else ','
+        names.append(name)
+        values.append([parse_value(choice) for choice in choices.split(separator)])
+    return [dict(zip(names, combination)) for combination in itertools.product(*values)]
+
+
+def summarize(params: dict[str, Any], results: list[SessionStats]) -> dict[str, Any]:
+    scores = [result.score for result in results]
+    return {
+        'params': params,
+        'sessions': len(results),
+        'score_mean': statistics.fmean(scores),
+        'score_stdev': statistics.pstdev(scores),
+        'kill_rate': statistics.fmean(result.kill_rate for result in results),
+        'starvation': statistics.fmean(result.starvation for result in results),
+        'shots': statistics.fmean(result.shots for result in results),
+        'frames': statistics.fmean(result.frames for result in results),
+    }
+
+
+def run_sweep(
+    grid: list[dict[str, Any]],
+    bot_params: BotParams,
+    sessions: int,
+    seed: int,
+    workers: int | None = None,
+) -> list[dict[str, Any]]:
+    tasks = [
+        (config_index, params, bot_params, seed + session)
+        for config_index, params in enumerate(grid)
+        for session in range(sessions)
+    ]
+    workers = workers or os.cpu_count() or 1
+    chunksize = max(1, len(tasks) // (workers * 8))
+    results: list[list[SessionStats]] = [[] for _ in grid]
+    with Pool(workers) as pool:
+        for config_index, stats in pool.imap_unordered(run_task, tasks, chunksize):
+            results[config_index].append(stats)
+    return [summarize(params, result) for params, result in zip(grid, results)]
+
+
+def main_cli(argv: list[str]) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        '--param',
+        action='append',
+        default=[],
+        help='NAME=V1,V2,... where NAME is Class.ATTRIBUTE; use ; to separate tuple values',
+    )
+    parser.add_argument('--sessions', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--aim-error', type=float, default=BotParams.aim_error)
+    parser.add_argument('--reaction-delay', type=int, default=BotParams.reaction_delay)
+    parser.add_argument('--flick-delay', type=int, default=BotParams.flick_delay)
+    parser.add_argument('--reload-delay', type=int, default=BotParams.reload_delay)
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args(argv)
+
+    bot_params = BotParams(
+        args.aim_error, args.reaction_delay, args.flick_delay, args.reload_delay
+    )
+    summaries = run_sweep(
+        parse_grid(args.param), bot_params, args.sessions, args.seed, args.workers
+    )
+    if args.json:
+        print(json.dumps({'bot': asdict(bot_params), 'results': summaries}, indent=2))
+        return
+    for summary in summaries:
+        print(
+            '{params}: score {score_mean:.0f} +- {score_stdev:.0f}, '
+            'kill rate {kill_rate:.2f}, starvation {starvation:.2f}, '
+            'shots {shots:.1f}, frames {frames:.0f}'.format(**summary)
+        )
+
+
+if __name__ == '__main__':
+    main_cli(sys.argv[1:])
@@ -20,8 +20,14 @@ import {
 } from "https://cdn.jsdelivr.net/npm/@mediapipe/tasks-vision@0.10.0";
 
 let handLandmarker = undefined;
+let currentNumHands = undefined;
 window.webcamRunning = false;
 window.detectionRunning = false
+window.numHands = window.numHands ?? 1;
+window.inputScale = window.inputScale ?? 1;
+// Detections per second, set from Python for each scene; 0 runs on every frame.
+window.detectionRate = window.detectionRate ?? 0;
+let lastDetectionTime = -Infinity;
 
 window.videoWidth = 0;
 window.videoHeight = 0;
@@ -38,6 +44,82 @@ window.getVideoTimes = function() {
     return lastVideoTime;
 }
 
+let resultResolvers = [];
+
+window.nextResults = function() {
+    return new Promise((resolve) => resultResolvers.push(resolve));
+}
+
+// Set from Python around the last detected hands, cleared after a miss.
+let regionOfInterest = null;
+const FULL_FRAME = { left: 0, top: 0, right: 1, bottom: 1 };
+const FULL_FRAME_INTERVAL = 30;
+let framesSinceFullFrame = 0;
+
+window.setRegionOfInterest = function(left, top, right, bottom) {
+    regionOfInterest = { left, top, right, bottom };
+}
+
+window.clearRegionOfInterest = function() {
+    regionOfInterest = null;
+}
+
+let resolveConnected = undefined;
+const connected = new Promise((resolve) => { resolveConnected = resolve; });
+
+window.waitConnected = function() {
+    return connected;
+}
+
+function publishResults() {
+    const resolvers = resultResolvers;
+    resultResolvers = [];
+    for (const resolve of resolvers) {
+        resolve(results);
+    }
+}
+
+// Versus mode socket to relay.py, Python polls the inbox once per frame.
+let versusSocket = null;
+let versusInbox = [];
+let versusOutbox = [];
+
+window.versusConnect = function(url) {
+    versusSocket = new WebSocket(url);
+    versusSocket.binaryType = "arraybuffer";
+    versusSocket.onopen = () => {
+        for (const data of versusOutbox) {
+            versusSocket.send(data);
+        }
+        versusOutbox = [];
+    };
+    versusSocket.onmessage = (event) => versusInbox.push(new Uint8Array(event.data));
+}
+
+window.versusSend = function(data) {
+    if (versusSocket?.readyState === WebSocket.OPEN) {
+        versusSocket.send(data);
+    } else {
+        versusOutbox.push(data);
+    }
+}
+
+window.versusReceive = function() {
+    const messages = versusInbox;
+    versusInbox = [];
+    return messages;
+}
+
+window.versusClosed = function() {
+    return versusSocket === null || versusSocket.readyState >= WebSocket.CLOSING;
+}
+
+window.versusClose = function() {
+    versusSocket?.close();
+    versusSocket = null;
+    versusOutbox = [];
+}
+
 const createHandLandmarker = async () => {
     const vision = await FilesetResolver.forVisionTasks(
         "https://cdn.jsdelivr.net/npm/@mediapipe/tasks-vision@0.10.0/wasm"
@@ -48,12 +130,15 @@ const createHandLandmarker = async () => {
             delegate: "CPU"
         },
         runningMode: "VIDEO",
-        numHands: 1
+        numHands: window.numHands
     });
+    currentNumHands = window.numHands;
 };
 await createHandLandmarker();
 
 const video = document.getElementById("webcam");
+const cropCanvas = document.createElement("canvas");
+const cropContext = cropCanvas.getContext("2d");
 
 const hasGetUserMedia = () => !!navigator.mediaDevices?.getUserMedia;
 
@@ -82,20 +167,81 @@ if (hasGetUserMedia()) {
     console.warn("getUserMedia() is not supported by your browser");
 }
 
+function detectRegion(region, timestamp) {
+    const sx = region.left * video.videoWidth;
+    const sy = region.top * video.videoHeight;
+    const sw = (region.right - region.left) * video.videoWidth;
+    const sh = (region.bottom - region.top) * video.videoHeight;
+    const width = Math.max(1, Math.round(sw * window.inputScale));
+    const height = Math.max(1, Math.round(sh * window.inputScale));
+    if (cropCanvas.width !== width || cropCanvas.height !== height) {
+        cropCanvas.width = width;
+        cropCanvas.height = height;
+    }
+    cropContext.drawImage(video, sx, sy, sw, sh, 0, 0, width, height);
+    const regionResults = handLandmarker.detectForVideo(cropCanvas, timestamp);
+    // map crop-normalized landmarks back to the full frame
+    for (const hand of regionResults.landmarks) {
+        for (const point of hand) {
+            point.x = (sx + point.x * sw) / video.videoWidth;
+            point.y = (sy + point.y * sh) / video.videoHeight;
+            point.z = point.z * sw / video.videoWidth;
+        }
+    }
+    return regionResults;
+}
+
+function detect(timestamp) {
+    let region = regionOfInterest;
+    if (framesSinceFullFrame >= FULL_FRAME_INTERVAL) {
+        region = null;
+    }
+    if (region === null) {
+        framesSinceFullFrame = 0;
+        if (window.inputScale < 1) {
+            return [detectRegion(FULL_FRAME, timestamp), null];
+        }
+        return [handLandmarker.detectForVideo(video, timestamp), null];
+    }
+    framesSinceFullFrame += 1;
+    const regionResults = detectRegion(region, timestamp);
+    if (regionResults.landmarks.length < currentNumHands) {
+        regionOfInterest = null;
+    }
+    return [regionResults, [region.left, region.top, region.right, region.bottom]];
+}
+
 async function predictWebcam() {
     window.videoWidth = video.videoWidth;
     window.videoHeight = video.videoHeight;
 
+    if (currentNumHands !== window.numHands) {
+        currentNumHands = window.numHands;
+        await handLandmarker.setOptions({ numHands: currentNumHands });
+    }
+
     let startTimeMs = performance.now();
-    if (lastVideoTime !== video.currentTime) {
+    const detectionDue = !(window.detectionRate > 0)
+        || startTimeMs - lastDetectionTime >= 1000 / window.detectionRate - 2;
+    if (lastVideoTime !== video.currentTime && detectionDue) {
         lastVideoTime = video.currentTime;
-        results = handLandmarker.detectForVideo(video, startTimeMs);
+        lastDetectionTime = startTimeMs;
+        const [detected, region] = detect(startTimeMs);
+        results = detected;
+        results.region = region;
         results.videoTime = video.currentTime
+        results.inferenceTime = performance.now() - startTimeMs;
+        results.videoWidth = video.videoWidth;
+        results.videoHeight = video.videoHeight;
+        publishResults();
     }
 
     if (window.webcamRunning === true) {
         window.requestAnimationFrame(predictWebcam);
     }
 
-    window.detectionRunning = true
+    if (!window.detectionRunning) {
+        window.detectionRunning = true
+        resolveConnected({ videoWidth: video.videoWidth, videoHeight: video.videoHeight });
+    }
 }
@@ -0,0 +1,448 @@
+"""Procedural MediaPipe hand landmark generator.
+
+Emits results in the same dict shape the game receives from
+`src/main.js` (videoTime, landmarks, videoWidth, videoHeight,
+inferenceTime) for scripted motions, with configurable noise, frame rate,
+latency and dropouts, so the gesture pipeline can be exercised without a
+camera or browser. Every stream also carries labels for the gestures its
+script performs.
+
+    python synthetic_hand.py            # correctness run through MediapipeManager
+    python synthetic_hand.py --bench    # generation throughput
+"""
+
+import argparse
+from dataclasses import dataclass, field
+import math
+import random
+import sys
+import time
+from typing import Any, Iterator
+
+# MediaPipe landmark layout of a hand pointing at the camera, in units of
+# the hand scale, game orientation (x right, y down), wrist at the origin.
+TEMPLATE = (
+    (0.0, 0.0),
+    (-0.25, -0.15),
+    (-0.4, -0.3),
+    (-0.5, -0.45),
+    (-0.55, -0.6),
+    (-0.15, -0.6),
+    (-0.15, -0.68),
+    (-0.15, -0.74),
+    (-0.15, -0.8),
+    (0.0, -0.6),
+    (0.05, -0.75),
+    (0.05, -0.6),
+    (0.0, -0.5),
+    (0.12, -0.55),
+    (0.17, -0.68),
+    (0.17, -0.55),
+    (0.12, -0.45),
+    (0.22, -0.48),
+    (0.27, -0.58),
+    (0.27, -0.48),
+    (0.22, -0.4),
+)
+THUMB_MCP, THUMB_IP, THUMB_TIP = 2, 3, 4
+INDEX_MCP, INDEX_PIP, INDEX_DIP, INDEX_TIP = 5, 6, 7, 8
+MIDDLE_PIP, MIDDLE_DIP, MIDDLE_TIP = 10, 11, 12
+RING_PIP = 14
+
+# wrist position relative to the aimed-at point
+WRIST_OFFSET = (0.05, 0.35)
+
+
+@dataclass
+class Segment:
+    kind: str
+    duration: float
+    point: tuple[float, float] | None = None
+    height: float = 0
+
+
+@dataclass
+class Label:
+    kind: str
+    start: float
+    end: float
+    point: tuple[float, float] | None = None
+
+
+def aim(point: tuple[float, float], duration: float = 0.7) -> list[Segment]:
+    return [Segment('aim', duration, point)]
+
+
+def move(point: tuple[float, float], duration: float = 0.3) -> list[Segment]:
+    return [Segment('move', duration, point)]
+
+
+def flick(height: float = 0.45, duration: float = 0.15) -> list[Segment]:
+    return [Segment('flick', duration, height=height)]
+
+
+def aim_hold_flick(
+    point: tuple[float, float], hold: float = 0.8, recover: float = 0.4
+) -> list[Segment]:
+    return move(point) + aim(point, hold) + flick() + move(point, recover)
+
+
+def reload(duration: float = 0.6) -> list[Segment]:
+    return [Segment('reload', duration)]
+
+
+def point_dwell(point: tuple[float, float], duration: float = 1.8) -> list[Segment]:
+    return [Segment('point', duration, point)]
+
+
+def dropout(duration: float = 0.2) -> list[Segment]:
+    return [Segment('dropout', duration)]
+
+
+def jitter(duration: float = 0.5, amplitude: float = 0.02) -> list[Segment]:
+    return [Segment('jitter', duration, height=amplitude)]
+
+
+@dataclass
+class StreamConfig:
+    fps: float = 30
+    latency: float = 0.05
+    latency_jitter: float = 0.01
+    noise: float = 0.002
+    landmark_noise: float = 0.0005
+    dropout_rate: float = 0
+    hand_scale: float = 0.12
+    sens: float = 0.5
+    video_width: int = 1280
+    video_height: int = 720
+    seed: int = 0
+
+
+@dataclass
+class SyntheticHandStream:
+    scripts: list[list[Segment]]
+    config: StreamConfig = field(default_factory=StreamConfig)
+
+    def __post_init__(self) -> None:
+        self.aspect = self.config.video_width / self.config.video_height
+        self.duration = max(sum(s.duration for s in script) for script in self.scripts)
+        self.labels = [label for script in self.scripts for label in self.label(script)]
+
+    @staticmethod
+    def label(script: list[Segment]) -> list[Label]:
+        labels = []
+        t = 0
+        for segment in script:
+            if segment.kind in ('flick', 'reload', 'point'):
+                kind = 'shoot' if segment.kind == 'flick' else segment.kind
+                labels.append(Label(kind, t, t + segment.duration, segment.point))
+            t += segment.duration
+        return labels
+
+    def __iter__(self) -> Iterator[tuple[float, dict[str, Any]]]:
+        rng = random.Random(self.config.seed)
+        frame_count = int(self.duration * self.config.fps)
+        cursors = [ScriptCursor(script) for script in self.scripts]
+        for frame in range(frame_count):
+            t = frame / self.config.fps
+            landmarks = []
+            for cursor in cursors:
+                points = cursor.sample(t, self.config, rng)
+                if points is None or rng.random() < self.config.dropout_rate:
+                    continue
+                landmarks.append(self.to_camera(points))
+            latency = max(0, rng.gauss(self.config.latency, self.config.latency_jitter))
+            yield t + latency, {
+                'videoTime': t + 1 / self.config.fps,
+                'landmarks': landmarks,
+                'videoWidth': self.config.video_width,
+                'videoHeight': self.config.video_height,
+                'inferenceTime': latency * 1000,
+            }
+
+    def results(self) -> Iterator[dict[str, Any]]:
+        for _, results in self:
+            yield results
+
+    def to_camera(self, points: list[tuple[float, float, float]]) -> list[dict[str, float]]:
+        # inverse of the mirror and aspect correction done by main.Hand
+        aspect = self.aspect
+        landmarks = []
+        for x, y, z in points:
+            x = 1 - x
+            if aspect < 1:
+                y = (y - 0.5) * aspect + 0.5
+            else:
+                x = (x - 0.5) / aspect + 0.5
+            landmarks.append({'x': x, 'y': y, 'z': z})
+        return landmarks
+
+
+class ScriptCursor:
+    def __init__(self, script: list[Segment]) -> None:
+        self.script = script
+        self.index = 0
+        self.start = 0.0
+        self.aim_point = (0.5, 0.5)
+        self.segment_start_point = self.aim_point
+        for segment in script:
+            if segment.point is not None:
+                self.aim_point = self.segment_start_point = segment.point
+                break
+
+    def sample(
+        self, t: float, config: StreamConfig, rng: random.Random
+    ) -> list[tuple[float, float, float]] | None:
+        while self.index < len(self.script):
+            segment = self.script[self.index]
+            if t < self.start + segment.duration:
+                break
+            self.finish(segment)
+            self.start += segment.duration
+            self.index += 1
+        if self.index >= len(self.script):
+            return None
+        segment = self.script[self.index]
+        progress = (t - self.start) / segment.duration if segment.duration else 1
+        noise = config.landmark_noise
+        # tracking noise moves the whole hand together, independent joint noise is small
+        shake = (rng.gauss(0, config.noise), rng.gauss(0, config.noise))
+
+        if segment.kind == 'dropout':
+            return None
+        if segment.kind == 'point':
+            points = pointing_pose(segment.point, config.hand_scale)
+        elif segment.kind == 'reload':
+            points = reload_pose(self.aim_point, config.hand_scale, config.sens)
+        else:
+            target = self.aim_point
+            wrist_lift = 0.0
+            if segment.kind == 'move':
+                ease = 0.5 - 0.5 * math.cos(math.pi * progress)
+                target = lerp(self.segment_start_point, segment.point, ease)
+            elif segment.kind == 'flick':
+                lift = segment.height * progress * progress
+                target = (target[0], target[1] - lift)
+                wrist_lift = lift * 0.2
+            elif segment.kind == 'jitter':
+                shake = (
+                    shake[0] + rng.gauss(0, segment.height),
+                    shake[1] + rng.gauss(0, segment.height),
+                )
+            points = aiming_pose(target, config.hand_scale, config.sens, wrist_lift)
+
+        return [
+            (
+                x + shake[0] + rng.gauss(0, noise),
+                y + shake[1] + rng.gauss(0, noise),
+                z,
+            )
+            for x, y, z in points
+        ]
+
+    def finish(self, segment: Segment) -> None:
+        if segment.kind in ('move', 'aim') and segment.point is not None:
+            self.aim_point = segment.point
+        self.segment_start_point = self.aim_point
+        if segment.kind == 'flick':
+            # recover from the top of the flick instead of snapping back
+            self.segment_start_point = (self.aim_point[0], self.aim_point[1] - segment.height)
+
+
+def lerp(a: tuple[float, float], b: tuple[float, float], t: float) -> tuple[float, float]:
+    return a[0] + (b[0] - a[0]) * t, a[1] + (b[1] - a[1]) * t
+
+
+def template_pose(
+    wrist: tuple[float, float], scale: float
+) -> list[list[float]]:
+    return [[wrist[0] + x * scale, wrist[1] + y * scale, 0.0] for x, y in TEMPLATE]
+
+
+def thumb_length(points: list[list[float]]) -> float:
+    return math.dist(points[THUMB_MCP], points[THUMB_IP]) + math.dist(
+        points[THUMB_IP], points[THUMB_TIP]
+    )
+
+
+def place_index(points: list[list[float]], tip: tuple[float, float]) -> None:
+    base = points[INDEX_MCP]
+    for joint, t in ((INDEX_PIP, 1 / 3), (INDEX_DIP, 2 / 3), (INDEX_TIP, 1)):
+        points[joint][0] = base[0] + (tip[0] - base[0]) * t
+        points[joint][1] = base[1] + (tip[1] - base[1]) * t
+
+
+def aiming_pose(
+    target: tuple[float, float], scale: float, sens: float, wrist_lift: float = 0
+) -> list[tuple[float, float, float]]:
+    wrist = (target[0] + WRIST_OFFSET[0], target[1] + WRIST_OFFSET[1] - wrist_lift)
+    points = template_pose(wrist, scale)
+    # main.Hand.calc_target: target = base + (tip - base) / thumb_length * sens
+    base = points[INDEX_MCP]
+    k = thumb_length(points) / sens
+    place_index(
+        points, (base[0] + (target[0] - base[0]) * k, base[1] + (target[1] - base[1]) * k)
+    )
+    return [tuple(point) for point in points]
+
+
+def reload_pose(
+    target: tuple[float, float], scale: float, sens: float
+) -> list[tuple[float, float, float]]:
+    points = [list(point) for point in aiming_pose(target, scale, sens)]
+    ring_pip = points[RING_PIP]
+    points[THUMB_TIP][:2] = [ring_pip[0] - 0.05 * scale, ring_pip[1]]
+    thumb_mcp = points[THUMB_MCP]
+    points[THUMB_IP][:2] = lerp(thumb_mcp, points[THUMB_TIP], 0.5)
+    points[THUMB_IP][1] -= 0.15 * scale
+    index_tip = points[INDEX_TIP]
+    middle_base = points[MIDDLE_PIP]
+    for joint, t in ((MIDDLE_DIP, 0.5), (MIDDLE_TIP, 1)):
+        points[joint][:2] = lerp(middle_base, (index_tip[0] + 0.05 * scale, index_tip[1]), t)
+    return [tuple(point) for point in points]
+
+
+def pointing_pose(point: tuple[float, float], scale: float) -> list[tuple[float, float, float]]:
+    wrist = (point[0] + 0.02, point[1] + 1.1 * scale)
+    points = template_pose(wrist, scale)
+    place_index(points, point)
+    return [tuple(point) for point in points]
+
+
+def replay(stream: SyntheticHandStream, mediapipe_manager: Any, fps: float = 30) -> Iterator[float]:
+    # feeds results to the manager as they would arrive at a game running at fps
+    pending = iter(stream)
+    upcoming = next(pending, None)
+    frame = 0
+    while upcoming is not None:
+        now = frame / fps
+        while upcoming is not None and upcoming[0] <= now:
+            mediapipe_manager.on_results(upcoming[1])
+            upcoming = next(pending, None)
+        mediapipe_manager.update()
+        yield now
+        frame += 1
+
+
+def demo_script(offset: float = 0) -> list[Segment]:
+    script = point_dwell((0.5 + offset, 0.55))
+    for x in (0.3, 0.5, 0.7):
+        script += aim_hold_flick((x + offset, 0.5))
+    script += reload() + move((0.5 + offset, 0.5)) + jitter() + dropout(0.15)
+    # retargeting upwards must not count as a flick
+    script += aim((0.5 + offset, 0.75), 0.6) + move((0.5 + offset, 0.55), 0.4)
+    script += aim_hold_flick((0.4 + offset, 0.6))
+    return script
+
+
+def detect_events(
+    frames: Any, config: StreamConfig, hand_num: int, shoot_mode: str | None = None
+) -> dict[str, list[float]]:
+    # game time of every gesture the detectors report for (arrival, results) frames
+    import main
+
+    mediapipe_manager = main.MediapipeManager(config.sens, hand_num, shoot_mode)
+    mediapipe_manager.on_connect(config.video_width, config.video_height)
+    events: dict[str, list[float]] = {'shoot': [], 'reload': [], 'point': []}
+    reloading = [False] * len(mediapipe_manager.tracks)
+    for now in replay(frames, mediapipe_manager):
+        for track_id, track in enumerate(mediapipe_manager.tracks):
+            if track.shoot_detector.is_shoot():
+                events['shoot'].append(now)
+            if track.reload_detector.is_reload() and not reloading[track_id]:
+                events['reload'].append(now)
+            reloading[track_id] = track.reload_detector.is_reload()
+            if track.point_detector.selected_point():
+                events['point'].append(now)
+    return events
+
+
+def match_events(
+    kind: str, times: list[float], labels: list[Label], slack: float = 0.3
+) -> tuple[int, list[float], int]:
+    # (labels, delays of the detected ones, false positives)
+    windows = [(label.start, label.end + slack) for label in labels if label.kind == kind]
+    delays = [
+        min(t for t in times if start <= t <= end) - start
+        for start, end in windows
+        if any(start <= t <= end for t in times)
+    ]
+    # a selection outside every dwell window, e.g. during a long aim, counts
+    # against precision like a stray shot or reload
+    false_positives = sum(not any(start <= t <= end for start, end in windows) for t in times)
+    return len(windows), delays, false_positives
+
+
+def check(
+    stream: SyntheticHandStream, shoot_mode: str | None = None, slack: float = 0.3
+) -> int:
+    events = detect_events(stream, stream.config, len(stream.scripts), shoot_mode)
+    failed = 0
+    for kind, times in events.items():
+        label_num, delays, false_positives = match_events(kind, times, stream.labels, slack)
+        hits = len(delays)
+        # selections only act on the menus, where nobody aims, so stray ones
+        # during play are reported but do not fail the check
+        clean = not false_positives or kind == 'point'
+        status = 'ok' if hits == label_num and clean else 'FAIL'
+        failed += status != 'ok'
+        print(
+            '{:7} labels {:3}  hits {:3}  false positives {:3}  delay {:5.3f}s  {}'.format(
+                kind,
+                label_num,
+                hits,
+                false_positives,
+                sum(delays) / len(delays) if delays else 0,
+                status,
+            )
+        )
+    return failed
+
+
+def bench(stream: SyntheticHandStream) -> None:
+    start = time.perf_counter()
+    frames = sum(1 for _ in stream)
+    elapsed = time.perf_counter() - start
+    print('{} frames in {:.3f}s ({:.0f} frames/s)'.format(frames, elapsed, frames / elapsed))
+
+
+def main_cli(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--bench', action='store_true')
+    parser.add_argument(
+        '--shoot-mode',
+        choices=('legacy', 'velocity'),
+        default=None,
+        help='MediapipeManager.SHOOT_MODE by default',
+    )
+    parser.add_argument('--hands', type=int, default=1)
+    parser.add_argument('--fps', type=float, default=StreamConfig.fps)
+    parser.add_argument('--latency', type=float, default=StreamConfig.latency)
+    parser.add_argument('--noise', type=float, default=StreamConfig.noise)
+    parser.add_argument('--landmark-noise', type=float, default=StreamConfig.landmark_noise)
+    parser.add_argument('--dropout-rate', type=float, default=StreamConfig.dropout_rate)
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    config = StreamConfig(
+        fps=args.fps,
+        latency=args.latency,
+        noise=args.noise,
+        landmark_noise=args.landmark_noise,
+        dropout_rate=args.dropout_rate,
+        seed=args.seed,
+    )
+    scripts = [
+        demo_script((hand - (args.hands - 1) / 2) * 0.15) * args.repeat
+        for hand in range(args.hands)
+    ]
+    stream = SyntheticHandStream(scripts, config)
+    if args.bench:
+        bench(stream)
+        return 0
+    return 1 if check(stream, args.shoot_mode) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main_cli(sys.argv[1:]))